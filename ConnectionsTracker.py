@@ -2,622 +2,928 @@
 
 import os
 import json
+import time
+import hashlib
 import logging
 import asyncio
 import datetime
 from dotenv import load_dotenv
 from typing import Literal
-from discord import app_commands, Intents, Embed, Color, Client, Message, Interaction, TextChannel, utils, Activity, ActivityType
-from discord.ext import tasks
-
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+from discord import app_commands, ui, ButtonStyle, Embed, File, Color, Client, AutoShardedClient, Message, Interaction, User, Object, utils, Activity, ActivityType
+
+from logs import setup_logging
+from profiles import client_options
+from reactions import ReactionDispatcher
+from broadcast import Broadcaster, chunk_mentions
+from analytics import HistoryAnalytics
+from charts import CHARTS_ENABLED, close_pool, roster_hash, leaderboard_data, scoreboard_data, trends_data, solve_rates_data
+from scoring import POLICIES, policy_wins, rescore
+from backfill import backfill
+from scheduler import DeadlineScheduler, local_now, next_midnight
+from tracker import Tracker, DayEnd, Reminder, TRACKER_SCOPE, tracker_key, split_key, read_tracker_states, move_legacy_files
+from games import GAMES, CONNECTIONS, match_game
+from storage import open_storage
+from sharding import JobLedger, shard_for, shard_options
+from metrics import metrics
+from leaderboard import get_win_percent, get_avg_guesses, get_average_mistakes, get_completion_percent
+
+START_TIME = time.perf_counter()
 load_dotenv()
 
 # Logger setup
+setup_logging()
 logger = logging.getLogger("Connections Tracker")
-logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter(fmt='[Connections] [%(asctime)s] [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-
-file_handler = logging.FileHandler('connections.log')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(formatter)
-
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-
-def get_score(player):
-    return player.score
-
-
-def get_wins(player):
-    return player.winCount
-
-
-def get_con_submissions(player):
-    return player.submissionCount
-
-
-def get_tot_guesses(player):
-    return player.totalGuessCount
-
-
-def get_cons(player):
-    return player.connectionCount
-
 
-def get_sub_cons(player):
-    return player.subConnectionCount
 
-
-def get_mistakes(player):
-    return player.mistakeCount
-
-
-def get_win_percent(player):
-    return ((player.winCount / player.submissionCount) * 100)
-
-
-def get_avg_guesses(player):
-    return (player.totalGuessCount / player.submissionCount)
-
-
-def get_average_mistakes(player):
-    return (player.mistakeCount / player.submissionCount)
-
-
-def get_completion_percent(player):
-    return ((player.connectionCount / player.submissionCount) * 100)
-
-
-class ConnectionsTrackerClient(Client):
-    FILENAME = 'info.json'
-
-    class Player():
-        def __init__(self, name):
-            self.name = name
-            self.score = 0
-            self.winCount = 0
-            self.connectionCount = 0
-            self.subConnectionCount = 0
-            self.mistakeCount = 0
-            self.submissionCount = 0
-            self.totalGuessCount = 0
-            self.registered = True
-            self.silenced = False
-            self.completedToday = False
-            self.succeededToday = False
-
-    def __init__(self, intents):
-        super(ConnectionsTrackerClient, self).__init__(intents=intents)
+# One client serves every server it is in. Each server (or channel, see TRACKER_SCOPE) gets its own Tracker,
+# loaded on first activity and evicted after TRACKER_IDLE seconds without any.
+# With SHARDS set it runs as an AutoShardedClient, and several processes can split the shards over one TRACKER_DIR.
+class ConnectionsTrackerClient(AutoShardedClient if shard_options() else Client):
+    def __init__(self, **options):
+        super(ConnectionsTrackerClient, self).__init__(**options)
         self.tree = app_commands.CommandTree(self)
-        self.text_channel: TextChannel
-        self.puzzle_number = 0
-        self.last_scored = datetime.datetime.now().astimezone() - datetime.timedelta(days=1)
-        self.scored_today = False
-        self.sent_warning = False
-        self.midnight_called = False
-        self.players = []
-
-    def read_json_file(self):
-        if os.path.exists(self.FILENAME):
-            with open(self.FILENAME, 'r', encoding='utf-8') as file:
-                logger.info(f'Reading {self.FILENAME}')
-                data = json.load(file)
-                for firstField, secondField in data.items():
-                    if firstField == 'text_channel':
-                        self.text_channel = self.get_channel(int(secondField['text_channel']))
-                        logger.info(f'Got text channel id of {self.text_channel.id}')
-                    elif firstField == 'puzzle_number':
-                        self.puzzle_number = secondField['puzzle_number']
-                        logger.info(f'Got day number of {self.puzzle_number}')
-                    elif firstField == 'last_scored':
-                        self.last_scored = datetime.datetime.fromisoformat(secondField['last_scored'])
-                        logger.info(f'Got last scored datetime of {self.last_scored.isoformat()}')
-                    elif firstField == 'scored_today':
-                        self.scored_today = secondField['scored_today']
-                        logger.info(f'Got scored today value of {self.scored_today}')
-                    else:
-                        player_exists = False
-                        for player in self.players:
-                            if firstField == player.name:
-                                player_exists = True
-                                break
-                        if not player_exists:
-                            load_player = self.Player(firstField)
-                            load_player.winCount = secondField['winCount']
-                            load_player.connectionCount = secondField['connectionCount']
-                            load_player.subConnectionCount = secondField['subConnectionCount']
-                            load_player.mistakeCount = secondField['mistakeCount']
-                            load_player.submissionCount = secondField['submissionCount']
-                            load_player.totalGuessCount = secondField['totalGuessCount']
-                            load_player.score = secondField['score']
-                            load_player.registered = secondField['registered']
-                            load_player.silenced = secondField['silenced']
-                            load_player.completedToday = secondField['completedToday']
-                            load_player.succeededToday = secondField['succeededToday']
-                            self.players.append(load_player)
-                            logger.info(f'Loaded player {load_player.name}\n'
-                                        f'\t\t\twins: {load_player.winCount}\n'
-                                        f'\t\t\tconnections: {load_player.connectionCount}\n'
-                                        f'\t\t\tsubConnections: {load_player.subConnectionCount}\n'
-                                        f'\t\t\tmistakes: {load_player.mistakeCount}\n'
-                                        f'\t\t\tsubmissions: {load_player.submissionCount}\n'
-                                        f'\t\t\ttotalGuesses: {load_player.totalGuessCount}\n'
-                                        f'\t\t\tscore: {load_player.score}\n'
-                                        f'\t\t\tregistered: {load_player.registered}\n'
-                                        f'\t\t\tsilenced: {load_player.silenced}\n'
-                                        f'\t\t\tcompleted: {load_player.completedToday}\n'
-                                        f'\t\t\tsucceeded: {load_player.succeededToday}')
-                logger.info(f'Successfully loaded {self.FILENAME}')
-
-    def write_json_file(self):
-        data = {}
-        data['text_channel'] = {'text_channel': self.text_channel.id}
-        data['puzzle_number'] = {'puzzle_number': self.puzzle_number}
-        data['last_scored'] = {'last_scored': self.last_scored.isoformat()}
-        data['scored_today'] = {'scored_today': self.scored_today}
-        for player in self.players:
-            data[player.name] = {'winCount': player.winCount,
-                                 'connectionCount': player.connectionCount,
-                                 'subConnectionCount': player.subConnectionCount,
-                                 'submissionCount': player.submissionCount,
-                                 'mistakeCount': player.mistakeCount,
-                                 'totalGuessCount': player.totalGuessCount,
-                                 'score': player.score,
-                                 'registered': player.registered,
-                                 'silenced': player.silenced,
-                                 'completedToday': player.completedToday,
-                                 'succeededToday': player.succeededToday}
-        json_data = json.dumps(data, indent=4)
-        logger.info(f'Writing {self.FILENAME}')
-        with open(self.FILENAME, 'w+', encoding='utf-8') as file:
-            file.write(json_data)
-
-    def get_scoreboard_embed(self, scoreboard: list):
-        embed = Embed(title=f"Scoreboard for Connections #{self.puzzle_number}",
-                      color=Color.green())
-        for score in scoreboard:
-            embed.add_field(name=score[0], value=score[1], inline=False)
-        return embed
-
-    async def process(self, message: Message, player: Player):
+        self.tracker_dir = os.getenv('TRACKER_DIR', 'trackers')
+        self.idle_timeout = float(os.getenv('TRACKER_IDLE', '3600'))
+        self.trackers = {}  # tracker key -> loaded Tracker
+        self.loading = {}  # tracker key -> task loading it
+        self.closing = {}  # tracker key -> task flushing it after eviction
+        self.channels = {}  # bound text channel id -> game name -> tracker key, so chatter in other channels never loads a tracker
+        self.tracker_states = {}  # tracker key -> state read at startup, used to schedule its jobs
+        self.command_hash = None
+        self.started = False
+        self.reactions = ReactionDispatcher(os.getenv('FEEDBACK_MODE', 'reactions'))
+        self.broadcaster = Broadcaster()
+        self.scheduler = DeadlineScheduler()
+        self.jobs = {}  # (tracker key, job name) -> scheduled Job
+        self.ledger = None
+
+    async def get_tracker(self, key: int) -> Tracker:
+        tracker = self.trackers.get(key)
+        if tracker is None:
+            task = self.loading.get(key)
+            if task is None:
+                task = self.loading[key] = asyncio.create_task(self.load_tracker(key))
+                task.add_done_callback(lambda _: self.loading.pop(key, None))
+            tracker = await asyncio.shield(task)
+        tracker.last_active = time.monotonic()
+        return tracker
+
+    async def load_tracker(self, key: int) -> Tracker:
+        # an evicted tracker must finish writing before it is read back
+        if key in self.closing:
+            await self.closing[key]
+        tracker = Tracker(self, key, os.path.join(self.tracker_dir, str(key)))
+        await tracker.load()
+        self.trackers[key] = tracker
+        if self.is_ready():
+            await tracker.resolve_player_ids()
+        return tracker
+
+    async def evict(self, key: int):
+        # flushes and drops a loaded tracker, its next use reads it back from storage
+        tracker = self.trackers.pop(key)
+        self.closing[key] = asyncio.ensure_future(tracker.close())
         try:
-            parseMsg = []
-            for line in message.content.split('\n'):
-                if 'Puzzle #' in line:
-                    logger.info(f'{player.name} submitted results for puzzle #{line.split("#")[1]}')
-                    puzzleNum = int(line.split('#')[1])
-                    if puzzleNum != self.puzzle_number:
-                        await message.channel.send(f'The current puzzle # is {self.puzzle_number}. Your submission for puzzle #{puzzleNum} has not been accepted.')
-                        return
-                elif '🟪' in line or '🟩' in line or '🟦' in line or '🟨' in line:
-                    parseMsg.append(line)
-            player.submissionCount += 1
-            subConnectionsToday = 0
-            player.score = 0
-            gotYellow = False
-            gotGreen = False
-            gotBlue = False
-            gotPurple = False
-            for guess in parseMsg:
-                player.totalGuessCount += 1
-                if '🟨🟨🟨🟨' in guess:
-                    gotYellow = True
-                    await message.add_reaction('🟨')
-                    player.subConnectionCount += 1
-                    subConnectionsToday += 1
-                    player.score += 1  # difficulty tweak
-                elif '🟩🟩🟩🟩' in guess:
-                    gotGreen = True
-                    await message.add_reaction('🟩')
-                    player.subConnectionCount += 1
-                    subConnectionsToday += 1
-                    player.score += 2
-                elif '🟦🟦🟦🟦' in guess:
-                    gotBlue = True
-                    await message.add_reaction('🟦')
-                    player.subConnectionCount += 1
-                    subConnectionsToday += 1
-                    player.score += 3
-                elif '🟪🟪🟪🟪' in guess:
-                    gotPurple = True
-                    await message.add_reaction('🟪')
-                    player.subConnectionCount += 1
-                    subConnectionsToday += 1
-                    player.score += 4
-                else:
-                    player.mistakeCount += 1
-            if gotYellow and gotGreen and gotBlue and gotPurple:
-                player.connectionCount += 1
-                player.succeededToday = True
-            logger.info(f'Player {player.name} - score: {player.score}, succeeded: {player.succeededToday}')
-
-            player.completedToday = True
-            client.write_json_file()
-            if player.score == 0:
-                await message.add_reaction('0️⃣')
-            elif player.score == 1:
-                await message.add_reaction('1️⃣')
-            elif player.score == 2:
-                await message.add_reaction('2️⃣')
-            elif player.score == 3:
-                await message.add_reaction('3️⃣')
-            elif player.score == 4:
-                await message.add_reaction('4️⃣')
-            elif player.score == 5:
-                await message.add_reaction('5️⃣')
-            elif player.score == 6:
-                await message.add_reaction('6️⃣')
-            elif player.score == 7:
-                await message.add_reaction('7️⃣')
-            elif player.score == 8:
-                await message.add_reaction('8️⃣')
-            elif player.score == 9:
-                await message.add_reaction('9️⃣')
-            elif player.score == 10:
-                await message.add_reaction('🔟')
-            if player.succeededToday:
-                await message.add_reaction('👍')
-            else:
-                await message.add_reaction('👎')
-        except Exception:
-            logger.info(f'User {player.name} submitted invalid result message')
-            await message.channel.send(f'{player.name}, you sent a Connections results message with invalid syntax. Please try again.')
-
-    def tally_scores(self) -> str:
-        if not self.players or self.scored_today:
-            return ''
-
-        logger.info(f'Tallying scores for puzzle #{self.puzzle_number}')
-        connections_players = []  # list of players who are registered and completed the connections
-        winners = []  # list of winners - the one/those with the highest score
-        scoreboard = []
-        placeCounter = 0
-
-        for player in self.players:
-            if player.registered and player.completedToday:
-                connections_players.append(player)
-        connections_players.sort(key=get_score, reverse=True)
-
-        if connections_players[0].score > 0:
-            for player in connections_players.copy():
-                if player.score == connections_players[0].score:
-                    player.winCount += 1
-                    winners.append(player)
-                else:
-                    break
-
-        prevScore = -1
-        for player in connections_players:
-            if player.score != prevScore:
-                placeCounter += 1
-            prevScore = player.score
-            if player.score == 1:
-                title = f"{placeCounter}. (1 point)"
-            else:
-                title = f"{placeCounter}. ({player.score} points)"
-            if player.winCount == 1:
-                subResult = f"{player.name} (1 win)"
-            else:
-                subResult = f"{player.name} ({player.winCount} wins)"
-            scoreboard.append([title, subResult])
-        return scoreboard
+            await self.closing[key]
+        finally:
+            del self.closing[key]
+
+    async def evict_idle(self):
+        now = time.monotonic()
+        for key, tracker in list(self.trackers.items()):
+            # skips trackers a lost job claim evicted meanwhile
+            if now - tracker.last_active < self.idle_timeout or self.trackers.get(key) is not tracker:
+                continue
+            await self.evict(key)
+            logger.info(f'Evicted idle tracker {key}')
+        self.scheduler.schedule(local_now() + datetime.timedelta(seconds=min(self.idle_timeout, 300)), 'tracker eviction', self.evict_idle)
+
+    async def adopt_legacy_state(self):
+        # a single-server deployment keeps its files in the working directory, move them to its server's tracker
+        if not any(os.path.exists(os.getenv(name, default)) for name, default in (('DB_FILENAME', 'connections.db'), ('JSON_FILENAME', 'info.json'))):
+            return
+        storage = await asyncio.to_thread(open_storage)
+        state = await asyncio.to_thread(storage.load_state)
+        storage.close()
+        if not state.get('text_channel'):
+            logger.info('Found saved state without a bound channel, leaving it in place')
+            return
+        channel = await self.fetch_channel(int(state['text_channel']))
+        key = tracker_key(channel.guild.id, channel.id)
+        await asyncio.to_thread(move_legacy_files, os.path.join(self.tracker_dir, str(key)))
+        logger.info(f'Moved saved state for channel {channel.id} to tracker {key}')
+
+    # the process running shard 0, or the only process, handles work that isn't tied to a server
+    @property
+    def primary(self) -> bool:
+        shard_ids = getattr(self, 'shard_ids', None)
+        return shard_ids is None or 0 in shard_ids
+
+    def owns(self, key: int, state: dict) -> bool:
+        # each process only runs the daily jobs of servers on its shards, trackers without a known server go to the primary
+        guild_id = state.get('guild_id') or (split_key(key)[0] if TRACKER_SCOPE == 'guild' else None)
+        if not self.shard_count or guild_id is None:
+            return self.primary
+        shard_ids = getattr(self, 'shard_ids', None)
+        return shard_ids is None or shard_for(guild_id, self.shard_count) in shard_ids
+
+    async def load_trackers(self):
+        if self.primary:
+            await self.adopt_legacy_state()
+        self.tracker_states = await asyncio.to_thread(read_tracker_states, self.tracker_dir)
+        for key, state in self.tracker_states.items():
+            if state.get('text_channel'):
+                self.channels.setdefault(int(state['text_channel']), {})[split_key(key)[1].name] = key
+        os.makedirs(self.tracker_dir, exist_ok=True)
+        self.ledger = await asyncio.to_thread(JobLedger, os.path.join(self.tracker_dir, 'jobs.db'), f'pid {os.getpid()} shards {getattr(self, "shard_ids", None)}')
+        if self.primary:
+            await asyncio.to_thread(self.ledger.prune)
 
     async def setup_hook(self):
+        # runs once after login and before connecting to the gateway, so reconnects never reload state
+        phase_start = time.perf_counter()
+        await self.load_trackers()
+        state_loaded = time.perf_counter()
+        if self.primary:
+            # commands are global, one process syncing them is enough
+            await self.sync_commands()
+        commands_synced = time.perf_counter()
+        await self.start_metrics()
+        logger.info(f'Startup phases: state of {len(self.tracker_states)} trackers {(state_loaded - phase_start) * 1000:.0f} ms, '
+                    f'command sync {(commands_synced - state_loaded) * 1000:.0f} ms')
+
+    async def start_metrics(self):
+        if not metrics.enabled:
+            return
+        metrics.gauge('uptime_seconds', lambda: time.perf_counter() - START_TIME, 'Seconds since the process started')
+        metrics.gauge('loaded_trackers', lambda: len(self.trackers), 'Trackers in memory')
+        metrics.gauge('bound_channels', lambda: len(self.channels), 'Channels with a tracker')
+        metrics.gauge('scheduled_jobs', lambda: len(self.scheduler), 'Pending scheduled jobs')
+        metrics.gauge('storage_bytes', lambda: sum(tracker.storage.size() for tracker in self.trackers.values()), 'Storage size on disk of the loaded trackers')
+        metrics.gauge('gateway_latency_seconds', lambda: self.latency, 'Discord gateway heartbeat latency')
+        if os.getenv('METRICS_PORT'):
+            await metrics.serve(os.getenv('METRICS_HOST', '127.0.0.1'), int(os.getenv('METRICS_PORT')))
+
+    async def sync_commands(self):
+        # a global sync is slow and rate limited, only do it when the command definitions changed
+        hash_filename = os.path.join(self.tracker_dir, 'commands.sha256')
+        if os.path.exists(hash_filename):
+            with open(hash_filename, 'r', encoding='utf-8') as file:
+                self.command_hash = file.read().strip()
+        commands = sorted((command.to_dict(self.tree) for command in self.tree.get_commands()), key=lambda command: command['name'])
+        command_hash = hashlib.sha256(json.dumps(commands, sort_keys=True).encode('utf-8')).hexdigest()
+        if command_hash == self.command_hash and not os.getenv('FORCE_COMMAND_SYNC'):
+            logger.info('Command definitions unchanged since the last sync, skipping command tree sync')
+            return
+        logger.info('Command definitions changed, syncing command tree')
         await self.tree.sync()
+        self.command_hash = command_hash
+        os.makedirs(self.tracker_dir, exist_ok=True)
+        with open(hash_filename, 'w', encoding='utf-8') as file:
+            file.write(command_hash)
+
+    async def open_dm(self, user_id: int):
+        # only needs the id, so it works without the member cache
+        return await self.create_dm(Object(user_id))
+
+    async def close(self):
+        # flush pending writes before disconnecting
+        for tracker in list(self.trackers.values()):
+            await tracker.close()
+        close_pool()
+        if self.ledger:
+            self.ledger.close()
+        await metrics.close()
+        await super().close()
 
 
 discord_token = os.getenv('DISCORD_TOKEN')
-client = ConnectionsTrackerClient(intents=Intents.all())
+client = ConnectionsTrackerClient(**client_options(os.getenv('RUNTIME_PROFILE', 'full')), **shard_options())
+
+
+GAME_CHOICES = [app_commands.Choice(name=game.title, value=game.name) for game in GAMES.values()]
+
+
+# Commands act on the given game's tracker, or on the game the channel is bound to if it is only bound to one, or on Connections
+async def get_interaction_tracker(interaction: Interaction, game: str = None) -> Tracker:
+    if game is None:
+        bound = client.channels.get(interaction.channel_id, {})
+        game = next(iter(bound)) if len(bound) == 1 else CONNECTIONS.name
+    tracker = await client.get_tracker(tracker_key(interaction.guild_id, interaction.channel_id, game))
+    if tracker.guild_id is None:
+        tracker.guild_id = interaction.guild_id
+    if (tracker.key, 'midnight') not in client.jobs:
+        # first use of a new tracker
+        schedule_tracker(tracker)
+    return tracker
 
 
 @client.event
 async def on_ready():
-    client.read_json_file()
-    if not warning_call.is_running():
-        warning_call.start()
-    if not midnight_call.is_running():
-        midnight_call.start()
+    # fires again on every reconnect, state is already loaded in setup_hook
     await client.change_presence(activity=Activity(type=ActivityType.playing, name="Connections"))
-    logger.info(f'{client.user} has connected to Discord!')
+    if client.started:
+        logger.info(f'{client.user} has reconnected to Discord')
+        return
+    client.started = True
+    client.scheduler.start()
+    for key, state in client.tracker_states.items():
+        if client.owns(key, state):
+            await start_tracker(key, state)
+    client.tracker_states = {}
+    await client.evict_idle()
+    logger.info(f'{client.user} has connected to Discord, {time.perf_counter() - START_TIME:.1f} s after start!')
 
 
 @client.event
 async def on_message(message: Message):
-    # message is from this bot or not in dedicated text channel
-    if message.channel.id != client.text_channel.id or message.author.bot or client.scored_today:
+    received_at = time.perf_counter()
+    # message is from this bot or not in a bound text channel
+    bound = client.channels.get(message.channel.id)
+    if bound is None or message.author.bot:
         return
+    # one search over the content picks the game it is a result of, only that game's parser runs and chat matches none
+    game = match_game(message.content)
+    for name, key in list(bound.items()):
+        tracker = await client.get_tracker(key)
+        if message.channel.id != tracker.text_channel_id or tracker.scored_today:
+            continue
 
-    if 'Connections' in message.content and 'Puzzle #' in message.content and ('🟨' in message.content or '🟩' in message.content or '🟦' in message.content or '🟪' in message.content):
-        # no registered players
-        if not client.players:
-            await message.channel.send(f'{message.author.mention}, there are no registered players! Please register and resend your results to be the first.')
-            return
-        # find player in memory
-        player: client.Player
-        foundPlayer = False
-        for player_it in client.players:
-            if message.author.name == player_it.name:
-                foundPlayer = True
-                player = player_it
-        # player is not registered
-        if not foundPlayer:
-            await message.channel.send(f'{message.author.name}, you are not registered! Please register and resend your results.')
-            return
-        # player has already sent results
-        if player.completedToday:
-            logger.info(f'{player.name} tried to resubmit results')
-            await message.channel.send(f'{player.name}, you have already submitted your results today.')
-            return
-
-        client.write_json_file()
-
-        # process player's results
-        await client.process(message, player)
-
-    for player in client.players:
-        if player.registered and not player.completedToday:
-            return
-    if not client.scored_today:
-        await score(midnight=False)
-        client.scored_today = True
-
+        result = None
+        if game is not None and game.name == name:
+            try:
+                result = game.parse(message.content)
+            except ValueError:
+                logger.info('User %s submitted invalid %s result message', message.author.name, name)
+                metrics.inc('submissions', outcome='invalid')
+                await message.channel.send(f'{message.author.name}, you sent a {game.title} results message with invalid syntax. Please try again.')
+                return
 
-@client.tree.command(name='register', description='Register for Connections tracking.')
-async def register_command(interaction: Interaction):
+        day = None
+        if result:
+            # the submission is applied by the tracker's writer, so concurrent ones can't both pass its checks
+            with metrics.time('process_seconds'):
+                day = await tracker.process(message, result, received_at)
+            metrics.observe('message_seconds', time.perf_counter() - received_at)
+        elif tracker.players.all_completed():
+            # e.g. the last player who hadn't submitted deregistered
+            day = await tracker.mutations.submit(tracker.finish_day)
+        if day:
+            await send_day_end(tracker, day)
+
+
+@client.tree.command(name='register', description='Register for tracking a game\'s results.')
+@app_commands.describe(game='The game to register for, defaults to the one tracked in this channel.')
+@app_commands.choices(game=GAME_CHOICES)
+@app_commands.guild_only()
+async def register_command(interaction: Interaction, game: str = None):
+    tracker = await get_interaction_tracker(interaction, game)
     response = ''
-    playerFound = False
-    for player in client.players:
-        if interaction.user.name.strip() == player.name.strip():
-            if player.registered:
-                logger.info(f'User {interaction.user.name.strip()} attempted to re-register for tracking')
-                response += 'You are already registered for Connections tracking!\n'
-            else:
-                logger.info(f'Registering user {interaction.user.name.strip()} for tracking')
-                player.registered = True
-                client.write_json_file()
-                response += 'You have been registered for Connections tracking.\n'
-            playerFound = True
-    if not playerFound:
+    player = tracker.find_player(interaction.user)
+    if player:
+        if player.registered:
+            logger.info(f'User {interaction.user.name.strip()} attempted to re-register for tracking')
+            response += f'You are already registered for {tracker.game.title} tracking!\n'
+        else:
+            logger.info(f'Registering user {interaction.user.name.strip()} for tracking')
+            player.registered = True
+            tracker.save_players(player)
+            response += f'You have been registered for {tracker.game.title} tracking.\n'
+    else:
         logger.info(f'Registering user {interaction.user.name.strip()} for tracking')
-        player_obj = client.Player(interaction.user.name.strip())
-        client.players.append(player_obj)
-        client.write_json_file()
-        response += 'You have been registered for Connections tracking.\n'
+        player_obj = tracker.new_player(interaction.user.name.strip(), interaction.user.id)
+        tracker.add_player(player_obj)
+        tracker.save_players(player_obj)
+        response += f'You have been registered for {tracker.game.title} tracking.\n'
     await interaction.response.send_message(response)
 
 
-@client.tree.command(name='deregister', description='Deregister from Connections tracking. Use twice to delete saved data.')
-async def deregister_command(interaction: Interaction):
-    players_copy = client.players.copy()
+@client.tree.command(name='deregister', description='Deregister from tracking a game\'s results. Use twice to delete saved data.')
+@app_commands.describe(game='The game to deregister from, defaults to the one tracked in this channel.')
+@app_commands.choices(game=GAME_CHOICES)
+@app_commands.guild_only()
+async def deregister_command(interaction: Interaction, game: str = None):
+    tracker = await get_interaction_tracker(interaction, game)
     response = ''
-    playerFound = False
-    for player in players_copy:
-        if player.name.strip() == interaction.user.name.strip():
-            if player.registered:
-                player.registered = False
-                logger.info(f'Deregistered user {player.name}')
-                response += 'You have been deregistered for Connections tracking. Deregistering a second time will delete your saved data.'
-            else:
-                client.players.remove(player)
-                logger.info(f'Deleted data for user {player.name}')
-                response += 'Your saved data has been deleted for Connections tracking.'
-            client.write_json_file()
-            playerFound = True
-    if not playerFound:
+    player = tracker.find_player(interaction.user)
+    if player:
+        if player.registered:
+            player.registered = False
+            tracker.save_players(player)
+            logger.info(f'Deregistered user {player.name}')
+            response += f'You have been deregistered for {tracker.game.title} tracking. Deregistering a second time will delete your saved data.'
+        else:
+            tracker.delete_player(player)
+            logger.info(f'Deleted data for user {player.name}')
+            response += f'Your saved data has been deleted for {tracker.game.title} tracking.'
+    else:
         logger.info(f'Non-existant user {interaction.user.name.strip()} attempted to deregister')
-        response += 'You have no saved data for Connections tracking.'
-    if not client.players:
-        client.scored_today = False
+        response += f'You have no saved data for {tracker.game.title} tracking.'
+    if not tracker.players:
+        tracker.scored_today = False
     await interaction.response.send_message(response)
 
 
 @client.tree.command(name='silenceping', description='Stop sending a daily warning ping to a specific user.')
 @app_commands.describe(username='Username of the person to silence pings for. Blank will apply it to whoever enters the command.')
 @app_commands.describe(silence='Whether to silence (true) or unsilence (false) daily reminder pings for a specific user.')
+@app_commands.guild_only()
 async def silenceping_command(interaction: Interaction, username: str = None, silence: bool = True):
+    tracker = await get_interaction_tracker(interaction)
     if not username:
         username = interaction.user.name
-    for player in client.players:
-        if player.name.lower() == username.lower():
-            if player.silenced and silence:
-                await interaction.response.send_message(f'One hour warning ping already silenced for {player.name}.')
-                return
-            elif not player.silenced and not silence:
-                await interaction.response.send_message(f'One hour warning ping already enabled for {player.name}.')
-                return
-            player.silenced = silence
-            if silence:
-                await interaction.response.send_message(f'Silenced one hour warning ping for {player.name}.')
-            else:
-                await interaction.response.send_message(f'Enabled one hour warning ping for {player.name}.')
+        player = tracker.find_player(interaction.user)
+    else:
+        player = tracker.players.get_by_name(username)
+    if player:
+        if player.silenced and silence:
+            await interaction.response.send_message(f'One hour warning ping already silenced for {player.name}.')
             return
-    await interaction.response(f'Could not find {player.name}.\n\n__Existing players:__\n' + "\n".join([player.name for player in client.players]))
+        elif not player.silenced and not silence:
+            await interaction.response.send_message(f'One hour warning ping already enabled for {player.name}.')
+            return
+        player.silenced = silence
+        tracker.save_players(player)
+        if silence:
+            await interaction.response.send_message(f'Silenced one hour warning ping for {player.name}.')
+        else:
+            await interaction.response.send_message(f'Enabled one hour warning ping for {player.name}.')
+        return
+    await interaction.response.send_message(f'Could not find {username}.\n\n__Existing players:__\n' + "\n".join([player.name for player in tracker.players]))
+
+
+@client.tree.command(name='dmreminders', description='Get the new puzzle and warning pings as direct messages instead of channel mentions.')
+@app_commands.describe(enable='Whether to get reminders by direct message (true) or by mention in the channel (false).')
+@app_commands.guild_only()
+async def dmreminders_command(interaction: Interaction, enable: bool = True):
+    tracker = await get_interaction_tracker(interaction)
+    player = tracker.find_player(interaction.user)
+    if not player:
+        await interaction.response.send_message(f'{interaction.user.name}, you are not registered!', ephemeral=True)
+        return
+    player.dmReminders = enable
+    tracker.save_players(player)
+    if enable:
+        await interaction.response.send_message(f'{player.name} will get reminders by direct message. If they can\'t be delivered you\'ll be mentioned in the channel instead.', ephemeral=True)
+    else:
+        await interaction.response.send_message(f'{player.name} will be mentioned in the channel for reminders.', ephemeral=True)
 
 
 @client.tree.command(name='bind', description='Set this channel as the text channel for Connections Tracker.')
-async def bind_command(interaction: Interaction):
+@app_commands.describe(game='The game to track in this channel, a channel can track several.')
+@app_commands.choices(game=GAME_CHOICES)
+@app_commands.guild_only()
+async def bind_command(interaction: Interaction, game: str = CONNECTIONS.name):
+    tracker = await get_interaction_tracker(interaction, game)
     try:
-        client.text_channel = interaction.channel
-        client.write_json_file()
-        await interaction.response.send_message(f'Successfully set text channel for Connections Tracker to {interaction.channel.name}!')
+        tracker.text_channel = interaction.channel
+        tracker.save_state()
+        await interaction.response.send_message(f'Successfully set text channel for {tracker.game.title} tracking to {interaction.channel.name}!')
     except Exception as e:
         logger.info(f'Failed to set text channel or write json during bind command: {e}')
         await interaction.response.send_message(f'Failed to set text channel or save config: {e}')
 
 
+@client.tree.command(name='schedule', description='Set the timezone and warning time for Connections Tracker.')
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def schedule_command(interaction: Interaction, timezone: str = None, warning_minutes: app_commands.Range[int, 0, 1439] = None):
+    tracker = await get_interaction_tracker(interaction)
+    if timezone is not None:
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.response.send_message(f'Unknown timezone {timezone}, use a name like America/New_York.', ephemeral=True)
+            return
+        tracker.timezone = timezone
+    if warning_minutes is not None:
+        tracker.warning_offset = warning_minutes
+    tracker.save_state()
+    schedule_tracker(tracker)
+    zone = tracker.timezone or 'the server\'s local time'
+    await interaction.response.send_message(f'Connections Tracker now uses {zone} and warns {time_left(tracker.warning_offset)} before midnight.')
+
+
+@client.tree.command(name='backfill', description='Import past results from this channel\'s message history.')
+@app_commands.describe(game='The game whose results to import, defaults to the one tracked in this channel.')
+@app_commands.choices(game=GAME_CHOICES)
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def backfill_command(interaction: Interaction, game: str = None):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    tracker = await get_interaction_tracker(interaction, game)
+    try:
+        imported = await backfill(tracker, interaction.channel)
+        await interaction.followup.send(f'Imported {imported} results from {interaction.channel.name}.', ephemeral=True)
+    except Exception as e:
+        logger.exception(f'Error while backfilling {interaction.channel.name}: {e}')
+        await interaction.followup.send(f'Backfill stopped with an error, run it again to resume: {e}', ephemeral=True)
+
+
+def get_rescore_embed(tracker: Tracker, result, applied: bool) -> Embed:
+    embed = Embed(title=f'Rescoring with scoring policy {result.policy.version}', color=Color.green() if applied else Color.orange(),
+                  description=f'From {result.old_policy.describe()}\nTo {result.policy.describe()}\n'
+                              f'{result.rows} submissions: {result.changed_places} daily places and the winners of {result.changed_days} days change.')
+    changes = tracker.rescore_diff(result)
+    for name, wins, new_wins, place, new_place in changes[:20]:
+        embed.add_field(name=name, value=f'{wins} → {new_wins} wins, #{place} → #{new_place}')
+    if len(changes) > 20:
+        embed.add_field(name='More', value=f'and {len(changes) - 20} more players', inline=False)
+    embed.set_footer(text='Applied.' if applied else 'Dry run, nothing was changed. Run it again with apply to commit.')
+    return embed
+
+
+@client.tree.command(name='rescore', description='Recompute past scores and wins with another scoring policy.')
+@app_commands.describe(version='Version of the scoring policy, from the scoring file.')
+@app_commands.describe(apply='Apply the new scores and wins. Without it only the changes are shown.')
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def rescore_command(interaction: Interaction, version: int, apply: bool = False):
+    tracker = await get_interaction_tracker(interaction)
+    if tracker.game is not CONNECTIONS:
+        await interaction.response.send_message(f'{tracker.game.title} has a single scoring policy, rescoring is only for Connections.', ephemeral=True)
+        return
+    policy = POLICIES.get(version)
+    if policy is None:
+        await interaction.response.send_message(f'Unknown scoring policy {version}, known are {", ".join(map(str, POLICIES))}.', ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    # computed off the event loop, then applied by the tracker's writer unless a submission came in meanwhile
+    for _ in range(3):
+        data = HistoryAnalytics(tracker.history)
+        result = await asyncio.to_thread(rescore, data, tracker.policy, policy, tracker.puzzle_number, tracker.scored_today)
+        embed = get_rescore_embed(tracker, result, apply)
+        if not apply:
+            break
+        if await tracker.mutations.submit(tracker.apply_rescore, result):
+            await asyncio.to_thread(tracker.history.rewrite)
+            break
+    else:
+        await interaction.followup.send('Submissions kept coming in while rescoring, try again in a moment.', ephemeral=True)
+        return
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+def format_latency(name: str, **labels) -> str:
+    histogram = metrics.histograms.get((name, tuple(sorted(labels.items()))))
+    if not histogram or not histogram.count:
+        return 'no samples'
+    return f'p50 {histogram.quantile(0.5) * 1000:g} ms, p99 {histogram.quantile(0.99) * 1000:g} ms, max {histogram.max * 1000:.1f} ms ({histogram.count})'
+
+
+@client.tree.command(name='botstatus', description='Show Connections Tracker\'s uptime, load and latencies.')
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def botstatus_command(interaction: Interaction):
+    embed = Embed(title='Connections Tracker status', color=Color.blue())
+    embed.add_field(name='Uptime', value=f'{datetime.timedelta(seconds=round(time.perf_counter() - START_TIME))}')
+    embed.add_field(name='Gateway latency', value=f'{client.latency * 1000:.0f} ms')
+    embed.add_field(name='Trackers', value=f'{len(client.trackers)} loaded, {len(client.channels)} bound channels')
+    embed.add_field(name='Scheduled jobs', value=f'{len(client.scheduler)}')
+    if metrics.enabled:
+        outcomes = ('accepted', 'rejected', 'duplicate', 'invalid', 'unregistered')
+        embed.add_field(name='Submissions', value=', '.join(f'{metrics.counter("submissions", outcome=outcome):g} {outcome}' for outcome in outcomes), inline=False)
+        embed.add_field(name='Message handling', value=format_latency('message_seconds'), inline=False)
+        embed.add_field(name='Feedback', value=format_latency('feedback_seconds'), inline=False)
+        embed.add_field(name='Persistence', value=f'{format_latency("persist_seconds")}, {metrics.counter("persisted_players"):g} player rows, '
+                                                  f'{metrics.counter("writes_avoided"):g} writes avoided, {metrics.counter("persist_failures"):g} failures', inline=False)
+        embed.add_field(name='Scheduler lag', value=format_latency('scheduler_lag_seconds'), inline=False)
+    else:
+        embed.set_footer(text='Set METRICS=1 or METRICS_PORT to collect latencies and submission counts.')
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+def get_player_stats_embed(player) -> Embed:
+    embed = Embed(title=f"{player.name}")
+    embed.add_field(name="Registered", value=f"{player.registered}", inline=False)
+    win_percent = round(get_win_percent(player), ndigits=2)
+    embed.add_field(name="Win Percentage", value=f"{win_percent} % of submissions", inline=False)
+    embed.add_field(name="Total Wins", value=f"{player.winCount}", inline=False)
+    embed.add_field(name="Submissions", value=f"{player.submissionCount}", inline=False)
+    average_guesses = round(get_avg_guesses(player), ndigits=2)
+    embed.add_field(name="Average Guesses", value=f"{average_guesses} per submission", inline=False)
+    embed.add_field(name="Total Guesses", value=f"{player.totalGuessCount}", inline=False)
+    completion_percent = round(get_completion_percent(player), ndigits=2)
+    embed.add_field(name="Completion Percentage", value=f"{completion_percent} % of submissions", inline=False)
+    embed.add_field(name="Total Successful Connections", value=f"{player.connectionCount}", inline=False)
+    embed.add_field(name="Total Successful Subconnections", value=f"{player.subConnectionCount}", inline=False)
+    average_mistakes = round(get_average_mistakes(player), ndigits=2)
+    embed.add_field(name="Average Mistakes", value=f"{average_mistakes} per submission", inline=False)
+    embed.add_field(name="Total Mistakes", value=f"{player.mistakeCount}", inline=False)
+    return embed
+
+
+def is_registered(player):
+    return player.registered
+
+
+class StatsView(ui.View):
+    # Discord allows 10 embeds per message, one is used for the header
+    PAGE_SIZE = 9
+
+    def __init__(self, tracker: Tracker, sort_by: str, total: int, show_unregistered: bool, page: int):
+        super().__init__(timeout=300)
+        self.tracker = tracker
+        self.sort_by = sort_by
+        self.total = total
+        self.show_unregistered = show_unregistered
+        self.page_count = max(1, -(-total // self.PAGE_SIZE))
+        self.page = min(max(page, 1), self.page_count)
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_button.disabled = self.page <= 1
+        self.next_button.disabled = self.page >= self.page_count
+
+    def get_embeds(self) -> list:
+        offset = (self.page - 1) * self.PAGE_SIZE
+        limit = min(self.PAGE_SIZE, self.total - offset)
+        players = self.tracker.leaderboard.page(self.sort_by, offset, limit, None if self.show_unregistered else is_registered)
+        embeds = [Embed(title=f"{self.tracker.game.title} Stats", description=f"Sorted by {self.sort_by}, page {self.page} of {self.page_count}", color=Color.green())]
+        embeds.extend(get_player_stats_embed(player) for player in players)
+        return embeds
+
+    async def change_page(self, interaction: Interaction, page: int):
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embeds=self.get_embeds(), view=self)
+
+    @ui.button(label='Previous', style=ButtonStyle.secondary)
+    async def previous_button(self, interaction: Interaction, button: ui.Button):
+        await self.change_page(interaction, self.page - 1)
+
+    @ui.button(label='Next', style=ButtonStyle.secondary)
+    async def next_button(self, interaction: Interaction, button: ui.Button):
+        await self.change_page(interaction, self.page + 1)
+
+
 @client.tree.command(name='stats', description='Show stats for all players.')
 @app_commands.describe(sort_by='Select the stat you want to sort by.')
 @app_commands.describe(show_x_players='Only show the first x number of players.')
+@app_commands.describe(page='Page of the leaderboard to start on.')
+@app_commands.describe(chart='Attach a chart of the most wins.')
+@app_commands.guild_only()
 async def stats_command(interaction: Interaction,
                         sort_by: Literal['Win %', 'Wins', 'Submissions', 'Avg. Guesses', 'Total Guesses', 'Completion %', 'Connections', 'Subconnections', 'Mistakes %', 'Mistakes'] = 'Win %',
                         show_x_players: int = -1,
-                        show_unregistered: bool = False):
-    players_copy = client.players.copy()
-    if show_x_players < 1:
-        show_x_players = len(players_copy)
-
-    if sort_by == 'Win %':
-        players_copy.sort(key=get_win_percent, reverse=True)
-    elif sort_by == 'Wins':
-        players_copy.sort(key=get_wins, reverse=True)
-    elif sort_by == 'Submissions':
-        players_copy.sort(key=get_con_submissions, reverse=True)
-    elif sort_by == 'Avg. Guesses':
-        players_copy.sort(key=get_avg_guesses, reverse=True)
-    elif sort_by == 'Total Guesses':
-        players_copy.sort(key=get_tot_guesses, reverse=True)
-    elif sort_by == 'Completion %':
-        players_copy.sort(key=get_completion_percent, reverse=True)
-    elif sort_by == 'Connections':
-        players_copy.sort(key=get_cons, reverse=True)
-    elif sort_by == 'Subconnections':
-        players_copy.sort(key=get_sub_cons, reverse=True)
-    elif sort_by == 'Mistake %':
-        players_copy.sort(key=get_average_mistakes)
-    elif sort_by == 'Mistakes':
-        players_copy.sort(key=get_mistakes)
-
-    embeds = [Embed(title="Connections Stats", color=Color.green())]
-    if show_x_players > len(players_copy):
-        show_x_players = len(players_copy)
-    for player in players_copy:
-        if show_x_players <= 0:
+                        show_unregistered: bool = False,
+                        page: int = 1,
+                        chart: bool = False):
+    tracker = await get_interaction_tracker(interaction)
+    total = len(tracker.players) if show_unregistered else len(tracker.players.registered)
+    if 0 < show_x_players < total:
+        total = show_x_players
+    view = StatsView(tracker, sort_by, total, show_unregistered, page)
+    options = {'embeds': view.get_embeds(), 'view': view if view.page_count > 1 else utils.MISSING, 'ephemeral': True}
+    if not chart:
+        await interaction.response.send_message(**options)
+    elif not CHARTS_ENABLED:
+        await interaction.response.send_message(CHARTS_OFF, **options)
+    else:
+        # a chart that isn't cached yet can take longer to render than Discord waits for a response
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        filename = await get_chart(tracker, 'leaderboard')
+        if filename:
+            options['file'] = File(filename, filename=os.path.basename(filename))
+        await interaction.followup.send(**options)
+
+
+async def get_history_tracker(interaction: Interaction, game: str = None) -> Tracker:
+    # solve rates, streaks and trends read Connections' guess rows, other games only have /stats and /headtohead
+    tracker = await get_interaction_tracker(interaction, game)
+    if tracker.game is not CONNECTIONS:
+        await interaction.response.send_message(f'Detailed history is only kept for Connections, use /stats for {tracker.game.title}.', ephemeral=True)
+        return None
+    return tracker
+
+
+def find_history_player(tracker: Tracker, interaction: Interaction, username: str):
+    if username:
+        return tracker.players.get_by_name(username)
+    return tracker.find_player(interaction.user)
+
+
+def get_history_embed(tracker: Tracker, data: HistoryAnalytics, player) -> Embed:
+    embed = Embed(title=f"{player.name}'s Connections History", color=Color.blue())
+    index = data.index(player.userId)
+    if index is None:
+        embed.description = 'No submissions recorded yet.'
+        return embed
+    embed.add_field(name="Submissions", value=f"{data.submissions[index]}", inline=False)
+    solve_rates = data.solve_rates()
+    embed.add_field(name="Solve Rates", value='\n'.join(f'{square} {round(rates[index] * 100, ndigits=1)} %' for square, rates in solve_rates.items()), inline=False)
+    for window in (7, 30):
+        # windows end at the current puzzle like in /trends
+        average_mistakes = round(data.rolling_mistakes(window, tracker.puzzle_number)[index], ndigits=2)
+        embed.add_field(name=f"Average Mistakes ({window} days)", value=f"{average_mistakes} per submission", inline=False)
+    return embed
+
+
+def get_streaks_embed(tracker: Tracker, data: HistoryAnalytics, player) -> Embed:
+    embed = Embed(title=f"{player.name}'s Connections Streaks", color=Color.blue())
+    index = data.index(player.userId)
+    if index is None:
+        embed.description = 'No submissions recorded yet.'
+        return embed
+    won = policy_wins(data, data.scores, tracker.policy, tracker.puzzle_number, tracker.scored_today)
+    for name, flags in (('Win', won), ('Completion', data.completed), ('Submission', np.ones(len(data), dtype=bool))):
+        current, longest = data.streaks(flags, tracker.puzzle_number)
+        embed.add_field(name=f"{name} Streak", value=f"{current[index]} current, {longest[index]} longest", inline=False)
+    return embed
+
+
+def get_trends_embed(tracker: Tracker, data: HistoryAnalytics, window: int) -> Embed:
+    embed = Embed(title=f"Connections Trends (last {window} days)", color=Color.blue())
+    average_mistakes = data.rolling_mistakes(window, tracker.puzzle_number)
+    active = (data.puzzles > tracker.puzzle_number - window) & (data.puzzles <= tracker.puzzle_number)
+    completion = data.per_user_mean(data.completed, active)
+    recent = np.bincount(data.user_index[active], minlength=len(data.user_ids))
+    # embeds are limited to 25 fields
+    for index in np.argsort(average_mistakes + (recent == 0) * 100, kind='stable')[:25]:
+        if not recent[index]:
             break
-        if not show_unregistered and not player.registered:
-            continue
-        show_x_players -= 1
-        embed = Embed(title=f"{player.name}")
-        embed.add_field(name="Registered", value=f"{player.registered}", inline=False)
-        win_percent = round(get_win_percent(player), ndigits=2)
-        embed.add_field(name="Win Percentage", value=f"{win_percent} % of submissions", inline=False)
-        embed.add_field(name="Total Wins", value=f"{player.winCount}", inline=False)
-        embed.add_field(name="Submissions", value=f"{player.submissionCount}", inline=False)
-        average_guesses = round(get_avg_guesses(player), ndigits=2)
-        embed.add_field(name="Average Guesses", value=f"{average_guesses} per submission", inline=False)
-        embed.add_field(name="Total Guesses", value=f"{player.totalGuessCount}", inline=False)
-        completion_percent = round(get_completion_percent(player), ndigits=2)
-        embed.add_field(name="Completion Percentage", value=f"{completion_percent} % of submissions", inline=False)
-        embed.add_field(name="Total Successful Connections", value=f"{player.connectionCount}", inline=False)
-        embed.add_field(name="Total Successful Subconnections", value=f"{player.subConnectionCount}", inline=False)
-        average_mistakes = round(get_average_mistakes(player), ndigits=2)
-        embed.add_field(name="Average Mistakes", value=f"{average_mistakes} per submission", inline=False)
-        embed.add_field(name="Total Mistakes", value=f"{player.mistakeCount}", inline=False)
-        embeds.append(embed)
-    await interaction.response.send_message(embeds=embeds, ephemeral=True)
-
-
-async def warning():
-    if not client.players or client.sent_warning or client.scored_today:
+        player = tracker.players.get_by_id(int(data.user_ids[index]))
+        name = player.name if player else f'<@{data.user_ids[index]}>'
+        embed.add_field(name=name, value=f"{round(average_mistakes[index], ndigits=2)} mistakes per submission, {round(completion[index] * 100, ndigits=1)} % completed", inline=False)
+    if not embed.fields:
+        embed.description = 'No submissions in this window.'
+    return embed
+
+
+@client.tree.command(name='history', description='Show solve rates and recent mistakes from your submission history.')
+@app_commands.describe(username='Username of the player to show. Blank will show whoever enters the command.')
+@app_commands.guild_only()
+async def history_command(interaction: Interaction, username: str = None):
+    tracker = await get_history_tracker(interaction)
+    if tracker is None:
         return
-    logger.info('It is 23:00, warning registered players who are not silenced and have not submitted results')
-    warning = ''
-    for player in client.players:
-        if player.registered and not player.completedToday and not player.silenced:
-            user = utils.get(client.users, name=player.name)
-            warning += f'{user.mention} '
-    if warning != '':
-        await client.text_channel.send(f'{warning}, you have one hour left to do the Connections!')
-    client.sent_warning = True
-
-
-@tasks.loop(hours=24)
-async def warning_call():
-    await warning()
-
-
-@warning_call.before_loop
-async def before_warning_call():
-    await client.wait_until_ready()
-    now = datetime.datetime.now().astimezone()
-    hr_before_midnight = now.replace(hour=23, minute=0, second=0, microsecond=0)
-    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
-    # Send warning if we passed 2300 and the bot wasn't running
-    if hr_before_midnight < now and now < midnight and not client.scored_today and not client.sent_warning:
-        logger.info('It is after 23:00 but before midnight, sending warning')
-        await warning()
-        hr_before_midnight += datetime.timedelta(days=1)
-    seconds_until_2300 = (hr_before_midnight - now).total_seconds()
-    logger.info(f'Sleeping for {seconds_until_2300} seconds until 23:00 {hr_before_midnight.isoformat()}')
-    await asyncio.sleep(seconds_until_2300)
-
-
-async def score(midnight: bool = False):
+    player = find_history_player(tracker, interaction, username)
+    if not player:
+        await interaction.response.send_message(f'Could not find {username or interaction.user.name}.', ephemeral=True)
+        return
+    data = HistoryAnalytics(tracker.history)
+    embed = await asyncio.to_thread(get_history_embed, tracker, data, player)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@client.tree.command(name='streaks', description='Show current and longest win and completion streaks.')
+@app_commands.describe(username='Username of the player to show. Blank will show whoever enters the command.')
+@app_commands.guild_only()
+async def streaks_command(interaction: Interaction, username: str = None):
+    tracker = await get_history_tracker(interaction)
+    if tracker is None:
+        return
+    player = find_history_player(tracker, interaction, username)
+    if not player:
+        await interaction.response.send_message(f'Could not find {username or interaction.user.name}.', ephemeral=True)
+        return
+    data = HistoryAnalytics(tracker.history)
+    embed = await asyncio.to_thread(get_streaks_embed, tracker, data, player)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@client.tree.command(name='trends', description='Show average mistakes and completion over recent days.')
+@app_commands.describe(window='Number of days to look back over.')
+@app_commands.guild_only()
+async def trends_command(interaction: Interaction, window: Literal[7, 30] = 7):
+    tracker = await get_history_tracker(interaction)
+    if tracker is None:
+        return
+    data = HistoryAnalytics(tracker.history, tracker.puzzle_number - window + 1, tracker.puzzle_number)
+    embed = await asyncio.to_thread(get_trends_embed, tracker, data, window)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@client.tree.command(name='headtohead', description='Compare your daily scores against another player.')
+@app_commands.describe(opponent='The player to compare against.')
+@app_commands.guild_only()
+async def headtohead_command(interaction: Interaction, opponent: User):
+    tracker = await get_interaction_tracker(interaction)
+    player = tracker.find_player(interaction.user)
+    other = tracker.find_player(opponent)
+    if not player or not other:
+        await interaction.response.send_message('Both players need to be registered for Connections tracking.', ephemeral=True)
+        return
+    data = HistoryAnalytics(tracker.history)
+    wins, losses, ties = await asyncio.to_thread(data.head_to_head, player.userId, other.userId)
+    await interaction.response.send_message(f'{player.name} vs {other.name}: {wins} wins, {losses} losses, {ties} ties', ephemeral=True)
+
+
+CHARTS_OFF = 'Charts are turned off, they need matplotlib installed and CHARTS=1.'
+CHART_TIMEOUT = float(os.getenv('CHART_TIMEOUT', '30'))
+CHART_CHOICES = {'Leaderboard': 'leaderboard', 'Scoreboard': 'scoreboard', 'Trends': 'trends', 'Solve Rates': 'solve_rates'}
+
+
+async def chart_data(tracker: Tracker, kind: str) -> dict:
+    if kind == 'leaderboard':
+        return leaderboard_data(tracker)
+    if kind == 'scoreboard':
+        return scoreboard_data(tracker)
+    if kind == 'trends':
+        data = HistoryAnalytics(tracker.history, tracker.puzzle_number - 29, tracker.puzzle_number)
+        return await asyncio.to_thread(trends_data, tracker, data, 30)
+    data = HistoryAnalytics(tracker.history)
+    return await asyncio.to_thread(solve_rates_data, tracker, data)
+
+
+async def get_chart(tracker: Tracker, kind: str, puzzle_number: int = None, data: dict = None) -> str:
+    # filename of the chart for the puzzle (today's by default) and the current roster, rendered unless it is cached.
+    # None if it failed or took longer than CHART_TIMEOUT seconds, it is still cached once it is done then.
+    async def prepare() -> dict:
+        return data if data is not None else await chart_data(tracker, kind)
+
+    roster = roster_hash(tracker.players.registered)
     try:
-        if midnight:
-            shamed = ''
-            for player in client.players:
-                if player.registered and not player.completedToday:
-                    user = utils.get(client.users, name=player.name)
-                    if user:
-                        shamed += f'{user.mention} '
-                    else:
-                        logger.info(f'Failed to mention user {player.name}')
-            if shamed != '':
-                await client.text_channel.send(f'SHAME ON {shamed} FOR NOT DOING THE CONNECTIONS #{client.puzzle_number}!')
-        client.last_scored = datetime.datetime.now()
-        scoreboard = client.tally_scores()
-        embed = client.get_scoreboard_embed(scoreboard)
-        await client.text_channel.send(embed=embed)
+        return await asyncio.wait_for(tracker.charts.get(kind, puzzle_number or tracker.puzzle_number, roster, prepare), CHART_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f'The {kind} chart of tracker {tracker.key} took longer than {CHART_TIMEOUT:g} s to render')
     except Exception as e:
-        logger.exception(f'Error while scoring: {e}')
+        logger.exception(f'Error while rendering the {kind} chart of tracker {tracker.key}: {e}')
+    return None
+
+
+@client.tree.command(name='chart', description='Show the leaderboard, today\'s scores, score trends or solve rates as a chart.')
+@app_commands.describe(chart='The chart to show.')
+@app_commands.describe(game='The game to chart, defaults to the one tracked in this channel.')
+@app_commands.choices(game=GAME_CHOICES)
+@app_commands.guild_only()
+async def chart_command(interaction: Interaction, chart: Literal['Leaderboard', 'Scoreboard', 'Trends', 'Solve Rates'] = 'Leaderboard', game: str = None):
+    if not CHARTS_ENABLED:
+        await interaction.response.send_message(CHARTS_OFF, ephemeral=True)
+        return
+    kind = CHART_CHOICES[chart]
+    if kind in ('trends', 'solve_rates'):
+        tracker = await get_history_tracker(interaction, game)
+        if tracker is None:
+            return
+    else:
+        tracker = await get_interaction_tracker(interaction, game)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    filename = await get_chart(tracker, kind)
+    if filename is None:
+        await interaction.followup.send('Could not draw the chart, try again in a moment.', ephemeral=True)
+        return
+    await interaction.followup.send(file=File(filename, filename=os.path.basename(filename)), ephemeral=True)
+
+
+def time_left(minutes: int) -> str:
+    if minutes == 60:
+        return 'one hour'
+    if minutes % 60 == 0:
+        return f'{minutes // 60} hours'
+    return f'{minutes} minutes'
+
+
+async def remind(tracker: Tracker, reminder: Reminder, template: str, direct_message: str, embed: Embed = None):
+    # mentions in the channel first, split over as many messages as they need with the embed on the first one,
+    # then DMs to the players who opted in, and mentions for those who couldn't be DMed
+    chunks = chunk_mentions(reminder.mentions, template)
+    parts = [{'content': content} for content in chunks]
+    if embed:
+        parts = [{'content': chunks[0] if chunks else None, 'embed': embed}] + parts[1:]
+    await client.broadcaster.send(tracker.text_channel, parts)
+    if reminder.direct:
+        failed = await client.broadcaster.send_direct(client.open_dm, reminder.direct, direct_message)
+        parts = [{'content': content} for content in chunk_mentions([f'<@{user_id}>' for user_id in failed], template)]
+        await client.broadcaster.send(tracker.text_channel, parts)
+
+
+async def warning(tracker: Tracker):
+    reminder = await tracker.mutations.submit(tracker.take_warning)
+    if reminder is None:
+        return
+    logger.info(f'It is {tracker.warning_offset} minutes before midnight, warning registered players of tracker {tracker.key} who are not silenced and have not submitted results')
+    left = time_left(tracker.warning_offset)
+    try:
+        await remind(tracker, reminder, f'{{mentions}}, you have {left} left to do the {tracker.game.title}!',
+                     f'You have {left} left to do the {tracker.puzzle_title}!')
+    except Exception as e:
+        logger.exception(f'Error while sending the warning of tracker {tracker.key}: {e}')
+
+
+async def send_day_end(tracker: Tracker, day: DayEnd):
+    parts = [{'content': content} for content in day.shame] + [{'embed': embed} for embed in day.scoreboard]
+    if CHARTS_ENABLED and day.scoreboard:
+        # the chart goes in the first scoreboard embed, without it if it can't be drawn in time
+        filename = await get_chart(tracker, 'scoreboard', day.puzzle_number, day.chart)
+        if filename:
+            day.scoreboard[0].set_image(url=f'attachment://{os.path.basename(filename)}')
+            parts[len(day.shame)]['file'] = filename
+    try:
+        await client.broadcaster.send(tracker.text_channel, parts)
+    except Exception as e:
+        logger.exception(f'Error while sending the scoreboard of tracker {tracker.key}: {e}')
 
 
-async def update():
+async def send_new_puzzle(tracker: Tracker, reminder: Reminder):
     try:
-        client.scored_today = False
-        client.sent_warning = False
-        everyone = ''
-        for player in client.players:
-            player.score = 0
-            player.completedToday = False
-            player.succeededToday = False
-            user = utils.get(client.users, name=player.name)
-            if user:
-                if player.registered:
-                    everyone += f'{user.mention} '
-            else:
-                logger.info(f'Failed to mention user {player.name}')
-        client.puzzle_number += 1
-        embed = Embed(title=f"It's time to find the Connections #{client.puzzle_number}!",
-                      description="[Connections](https://www.nytimes.com/games/connections)",
+        game = tracker.game
+        embed = Embed(title=f"It's time to find the {tracker.puzzle_title}!",
+                      description=f"[{game.title}]({game.url})",
                       color=Color.blue())
-        embed.set_thumbnail(url="https://static01.nyt.com/images/2023/08/25/crosswords/alpha-connections-icon-original/alpha-connections-icon-original-smallSquare252.png?format=pjpg&quality=75&auto=webp&disable=upscale")
+        if game.thumbnail:
+            embed.set_thumbnail(url=game.thumbnail)
         embed.set_footer(text="Created by Cubic Sphere")
-        await client.text_channel.send(content=f"{everyone}", embed=embed)
+        await remind(tracker, reminder, '{mentions}',
+                     f"It's time to find the {tracker.puzzle_title}! {game.url}", embed)
     except Exception as e:
-        logger.exception(f'Error while sending out midnight message: {e}')
-    client.write_json_file()
+        logger.exception(f'Error while sending out midnight message for tracker {tracker.key}: {e}')
 
 
-@tasks.loop(hours=24)
-async def midnight_call():
-    if not client.players:
-        return
-    while datetime.datetime.now().astimezone().date() == client.last_scored.date():
-        await asyncio.sleep(1)
-    logger.info('It is midnight, sending daily scoreboard if unscored and then mentioning registered players')
-    if not client.scored_today:
-        await score(midnight=True)
-    await update()
-
-
-@midnight_call.before_loop
-async def before_midnight_call():
-    await client.wait_until_ready()
-    now = datetime.datetime.now().astimezone()
-    # Update if the date changed and the bot wasn't running
-    if client.last_scored.date() < now.date() and not client.scored_today:
-        logger.info('Last scored date is before today and we have not yet scored today')
-        await update()
-    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
-    seconds_until_midnight = (midnight - now).total_seconds()
-    logger.info(f'Sleeping for {seconds_until_midnight} seconds until midnight {midnight.isoformat()}')
-    await asyncio.sleep(seconds_until_midnight)
-
-
-client.run(discord_token)
+async def update(tracker: Tracker):
+    await send_new_puzzle(tracker, await tracker.mutations.submit(tracker.start_day))
+
+
+async def rollover(tracker: Tracker):
+    day, reminder = await tracker.mutations.submit(tracker.rollover)
+    if day:
+        await send_day_end(tracker, day)
+    await send_new_puzzle(tracker, reminder)
+
+
+# Daily jobs are absolute deadlines in each tracker's timezone. Each job schedules its next run from the
+# current time when it finishes, so clock jumps and DST changes are picked up instead of drifting.
+# Jobs only hold the tracker key, an evicted tracker is loaded again when its job runs.
+def schedule_job(key: int, name: str, deadline: datetime.datetime, callback):
+    job = client.jobs.pop((key, name), None)
+    if job:
+        job.cancel()
+    client.jobs[(key, name)] = client.scheduler.schedule(deadline, f'{name} for tracker {key}', callback)
+
+
+def schedule_warning(key: int, tzinfo: datetime.tzinfo, warning_offset: int):
+    now = local_now(tzinfo)
+    offset = datetime.timedelta(minutes=warning_offset)
+    deadline = next_midnight(now, tzinfo) - offset
+    if deadline <= now:
+        deadline = next_midnight(deadline + offset, tzinfo) - offset
+    schedule_job(key, 'warning', deadline, lambda: warning_job(key))
+
+
+def schedule_midnight(key: int, tzinfo: datetime.tzinfo):
+    schedule_job(key, 'midnight', next_midnight(local_now(tzinfo), tzinfo), lambda: midnight_job(key))
+
+
+def schedule_tracker(tracker: Tracker):
+    schedule_warning(tracker.key, tracker.tzinfo, tracker.warning_offset)
+    schedule_midnight(tracker.key, tracker.tzinfo)
+
+
+async def claim_job(tracker: Tracker, name: str) -> bool:
+    # a job runs once per tracker and local day, whichever process claims it first
+    day = local_now(tracker.tzinfo).date().isoformat()
+    if await asyncio.to_thread(client.ledger.claim, tracker.key, name, day):
+        return True
+    logger.info(f'The {name} job of tracker {tracker.key} for {day} already ran, skipping it')
+    if client.trackers.get(tracker.key) is tracker:
+        # the process that ran it changed the saved state, e.g. rolled over to the next puzzle, so this copy is stale
+        await client.evict(tracker.key)
+    return False
+
+
+async def warning_job(key: int):
+    tracker = await client.get_tracker(key)
+    try:
+        if await claim_job(tracker, 'warning'):
+            with metrics.time('job_seconds', job='warning'):
+                await warning(tracker)
+    finally:
+        schedule_warning(key, tracker.tzinfo, tracker.warning_offset)
+
+
+async def midnight_job(key: int):
+    tracker = await client.get_tracker(key)
+    try:
+        if tracker.players and await claim_job(tracker, 'midnight'):
+            logger.info(f'It is midnight for tracker {key}, sending daily scoreboard if unscored and then mentioning registered players')
+            with metrics.time('job_seconds', job='midnight'):
+                await rollover(tracker)
+    finally:
+        schedule_midnight(key, tracker.tzinfo)
+
+
+async def start_tracker(key: int, state: dict):
+    # schedules a tracker's jobs from its saved state, it is only loaded if it missed a job while the bot wasn't running
+    tzinfo = ZoneInfo(state['timezone']) if state.get('timezone') else None
+    warning_offset = state.get('warning_offset', 60)
+    now = local_now(tzinfo)
+    last_scored = datetime.datetime.fromisoformat(state['last_scored']) if 'last_scored' in state else now - datetime.timedelta(days=1)
+    if state.get('text_channel'):
+        if last_scored.astimezone(tzinfo).date() < now.date() and not state.get('scored_today'):
+            tracker = await client.get_tracker(key)
+            if await claim_job(tracker, 'midnight'):
+                logger.info(f'Last scored date of tracker {key} is before today and it has not yet scored today')
+                await update(tracker)
+        elif next_midnight(now, tzinfo) - datetime.timedelta(minutes=warning_offset) <= now:
+            tracker = await client.get_tracker(key)
+            if await claim_job(tracker, 'warning'):
+                logger.info(f'It is after the warning time of tracker {key} but before midnight, sending warning')
+                await warning(tracker)
+    schedule_warning(key, tzinfo, warning_offset)
+    schedule_midnight(key, tzinfo)
+
+
+if __name__ == '__main__':
+    client.run(discord_token)
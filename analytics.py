@@ -0,0 +1,110 @@
+import numpy as np
+
+from history import HistoryStore
+from result_parser import COLOR_SQUARES
+
+
+def column(segments: list, name: str, dtype) -> np.ndarray:
+    if not segments:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate([np.frombuffer(segment.columns[name], dtype=dtype) for segment in segments])
+
+
+# NumPy view of the submission history with one entry per submission.
+# Build it on the event loop (it copies the columns) and run the queries in a worker thread.
+class HistoryAnalytics():
+    def __init__(self, store: HistoryStore, first_puzzle: int = None, last_puzzle: int = None):
+        segments = [segment for segment in store.segments(first_puzzle, last_puzzle) if len(segment)]
+        puzzles = column(segments, 'puzzle_number', np.uint32).astype(np.int64)
+        users = column(segments, 'user_id', np.uint64)
+        mistakes = column(segments, 'mistakes', np.uint8).astype(np.int64)
+        scores = column(segments, 'score', np.uint8).astype(np.int64)
+        guess_counts = column(segments, 'guess_count', np.uint8).astype(np.int64)
+        guesses = np.concatenate([np.frombuffer(segment.guesses, dtype=np.uint8) for segment in segments]) if segments else np.zeros(0, dtype=np.uint8)
+
+        # bitmask of solved colors per submission, a solved row is four squares of one color (0b00000000, 0b01010101, ...)
+        colors = (guesses & 3).astype(np.int64)
+        solved_bits = np.where(guesses == colors * 0b01010101, 1 << colors, 0)
+        solved = np.zeros(len(puzzles), dtype=np.int64)
+        if len(guesses):
+            starts = np.concatenate(([0], np.cumsum(guess_counts)[:-1]))
+            solved = np.bitwise_or.reduceat(solved_bits, starts)
+
+        keep = np.ones(len(puzzles), dtype=bool)
+        if first_puzzle is not None:
+            keep &= puzzles >= first_puzzle
+        if last_puzzle is not None:
+            keep &= puzzles <= last_puzzle
+        self.puzzles = puzzles[keep]
+        self.mistakes = mistakes[keep]
+        self.scores = scores[keep]
+        self.solved = solved[keep]
+        self.user_ids, self.user_index = np.unique(users[keep], return_inverse=True)
+        self.submissions = np.bincount(self.user_index, minlength=len(self.user_ids))
+
+        # wins depend on the tracker's scoring policy, see scoring.policy_wins
+        self.puzzle_ids, self.puzzle_index = np.unique(self.puzzles, return_inverse=True)
+        self.completed = self.solved == 0b1111
+
+    def __len__(self):
+        return len(self.puzzles)
+
+    def index(self, user_id: int):
+        position = np.searchsorted(self.user_ids, np.uint64(user_id))
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return int(position)
+        return None
+
+    def per_user_mean(self, values: np.ndarray, mask: np.ndarray = None) -> np.ndarray:
+        users = self.user_index if mask is None else self.user_index[mask]
+        values = values if mask is None else values[mask]
+        totals = np.bincount(users, weights=values, minlength=len(self.user_ids))
+        counts = np.bincount(users, minlength=len(self.user_ids))
+        return np.divide(totals, counts, out=np.zeros(len(self.user_ids)), where=counts > 0)
+
+    def solve_rates(self) -> dict:
+        # color square -> fraction of each user's submissions that solved it
+        return {square: self.per_user_mean((self.solved >> color) & 1) for color, square in enumerate(COLOR_SQUARES)}
+
+    def rolling_mistakes(self, window: int, last_puzzle: int = None) -> np.ndarray:
+        if last_puzzle is None:
+            last_puzzle = int(self.puzzles.max()) if len(self) else 0
+        return self.per_user_mean(self.mistakes, (self.puzzles > last_puzzle - window) & (self.puzzles <= last_puzzle))
+
+    def streaks(self, flags: np.ndarray, last_puzzle: int = None) -> tuple:
+        # (current, longest) runs of consecutive puzzles where flags is set for each user.
+        # The current streak may end at last_puzzle or the puzzle before, since today might not be submitted yet.
+        user_count = len(self.user_ids)
+        if not len(self):
+            return np.zeros(user_count, dtype=np.int64), np.zeros(user_count, dtype=np.int64)
+        if last_puzzle is None:
+            last_puzzle = int(self.puzzles.max())
+        first_puzzle = int(self.puzzles.min())
+        width = last_puzzle - first_puzzle + 2  # one extra column so runs never wrap to the next user
+        grid = np.zeros((user_count, width), dtype=np.int8)
+        in_range = self.puzzles <= last_puzzle
+        grid[self.user_index[in_range & flags], self.puzzles[in_range & flags] - first_puzzle] = 1
+        edges = np.diff(np.concatenate(([0], grid.ravel(), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        lengths = ends - starts
+        run_users = starts // width
+        longest = np.zeros(user_count, dtype=np.int64)
+        np.maximum.at(longest, run_users, lengths)
+        current = np.zeros(user_count, dtype=np.int64)
+        last_column = (ends - 1) % width
+        ongoing = last_column >= width - 3
+        current[run_users[ongoing]] = lengths[ongoing]
+        return current, longest
+
+    def head_to_head(self, user_id: int, opponent_id: int) -> tuple:
+        # (wins, losses, ties) by daily score on the puzzles both players submitted
+        positions = [self.index(user_id), self.index(opponent_id)]
+        if None in positions:
+            return 0, 0, 0
+        mine = self.user_index == positions[0]
+        theirs = self.user_index == positions[1]
+        _, my_rows, their_rows = np.intersect1d(self.puzzles[mine], self.puzzles[theirs], assume_unique=True, return_indices=True)
+        my_scores = self.scores[mine][my_rows]
+        their_scores = self.scores[theirs][their_rows]
+        return int((my_scores > their_scores).sum()), int((my_scores < their_scores).sum()), int((my_scores == their_scores).sum())
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+
+from discord import Object
+
+from games import match_game
+from tracker import tracker_key
+
+logger = logging.getLogger("Connections Tracker")
+
+running = set()  # channel ids with a backfill in progress
+
+
+def read_checkpoint(filename: str) -> dict:
+    if not os.path.exists(filename):
+        return {'cursor': None, 'imported': 0, 'scores': {}}
+    with open(filename, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_checkpoint(filename: str, checkpoint: dict):
+    with open(f'{filename}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file)
+    os.replace(f'{filename}.tmp', filename)
+
+
+# Imports results from a channel's message history, oldest first, a page at a time.
+# The cursor (last message id handled) is checkpointed after every page so an interrupted run resumes where it stopped.
+# Puzzles that already have history were scored live, their submissions are skipped and their wins are not re-tallied.
+async def backfill(tracker, channel, checkpoint_filename: str = None, page_size: int = 100, delay: float = 1.0, until_puzzle: int = None) -> int:
+    if channel.id in running:
+        raise RuntimeError(f'A backfill of channel {channel.id} is already running')
+    running.add(channel.id)
+    try:
+        return await run_backfill(tracker, channel, checkpoint_filename, page_size, delay, until_puzzle)
+    finally:
+        running.discard(channel.id)
+
+
+async def run_backfill(tracker, channel, checkpoint_filename: str, page_size: int, delay: float, until_puzzle: int) -> int:
+    if checkpoint_filename is None:
+        checkpoint_filename = os.path.join(tracker.directory, f'backfill-{channel.id}.json')
+    if until_puzzle is None:
+        until_puzzle = tracker.puzzle_number or None
+    checkpoint = await asyncio.to_thread(read_checkpoint, checkpoint_filename)
+    # puzzle -> user id -> score for puzzles imported by this backfill, wins are tallied at the end
+    scores = {int(puzzle): {int(user_id): score for user_id, score in users.items()} for puzzle, users in checkpoint['scores'].items()}
+    submitted = set()
+    live_puzzles = set()
+    for row in tracker.history.rows():
+        submitted.add((row.puzzle_number, row.user_id))
+        if row.puzzle_number not in scores:
+            live_puzzles.add(row.puzzle_number)
+    logger.info(f'Backfilling channel {channel.id} from cursor {checkpoint["cursor"]}')
+    imported = 0
+
+    while True:
+        after = Object(id=checkpoint['cursor']) if checkpoint['cursor'] else None
+        page = [message async for message in channel.history(limit=page_size, after=after, oldest_first=True)]
+        if not page:
+            break
+        tracker.last_active = time.monotonic()  # keep it from being evicted while importing
+        changed = []
+        for message in page:
+            checkpoint['cursor'] = message.id
+            if message.author.bot:
+                continue
+            if match_game(message.content) is not tracker.game:
+                continue
+            try:
+                result = tracker.game.parse(message.content)
+            except ValueError:
+                continue
+            if not result or result.puzzle_number in live_puzzles:
+                continue
+            if until_puzzle is not None and result.puzzle_number >= until_puzzle:
+                continue
+            if (result.puzzle_number, message.author.id) in submitted:
+                continue
+            submitted.add((result.puzzle_number, message.author.id))
+            player = tracker.find_player(message.author)
+            if not player:
+                # imported players need to /register before they are pinged
+                player = tracker.new_player(message.author.name, message.author.id)
+                player.registered = False
+                tracker.add_player(player)
+            score = tracker.apply_result(player, result)
+            tracker.history.append(result.puzzle_number, message.author.id, result.guesses, result.mistakes, score, message.created_at.timestamp())
+            if tracker.policy.can_win(result.succeeded):
+                scores.setdefault(result.puzzle_number, {})[message.author.id] = score
+            checkpoint['imported'] += 1
+            imported += 1
+            changed.append(player)
+        if changed:
+            tracker.save_players(*changed)
+            tracker.persistence.mark_history()
+        # everything up to the cursor must be saved before the checkpoint says it was handled
+        await tracker.persistence.flush()
+        checkpoint['scores'] = {str(puzzle): {str(user_id): score for user_id, score in users.items()} for puzzle, users in scores.items()}
+        await asyncio.to_thread(write_checkpoint, checkpoint_filename, checkpoint)
+        logger.info(f'Backfill of channel {channel.id} reached message {checkpoint["cursor"]}, {checkpoint["imported"]} results imported')
+        if len(page) < page_size:
+            break
+        await asyncio.sleep(delay)
+
+    winners = []
+    for puzzle, users in scores.items():
+        top_score = max(users.values())
+        if top_score <= 0:
+            continue
+        for user_id, score in users.items():
+            player = tracker.players.get_by_id(user_id)
+            if score == top_score and player:
+                player.winCount += 1
+                winners.append(player)
+    if winners:
+        tracker.save_players(*winners)
+    await tracker.persistence.flush()
+    if imported:
+        tracker.charts.invalidate()
+    checkpoint['scores'] = {}
+    await asyncio.to_thread(write_checkpoint, checkpoint_filename, checkpoint)
+    logger.info(f'Backfill of channel {channel.id} finished, {imported} results imported this run and {checkpoint["imported"]} in total')
+    return imported
+
+
+async def main():
+    from ConnectionsTracker import client, discord_token
+    async with client:
+        # logging in runs setup_hook, which loads the saved state
+        await client.login(discord_token)
+        if len(sys.argv) < 2:
+            print('Usage: python backfill.py <channel id> [game]')
+            return
+        channel = await client.fetch_channel(int(sys.argv[1]))
+        tracker = await client.get_tracker(tracker_key(channel.guild.id, channel.id, *sys.argv[2:3]))
+        await backfill(tracker, channel)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
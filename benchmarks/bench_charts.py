@@ -0,0 +1,58 @@
+import os
+import sys
+import types
+import asyncio
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore  # noqa: E402
+from analytics import HistoryAnalytics  # noqa: E402
+from games import CONNECTIONS  # noqa: E402
+from charts import CHARTS_ENABLED, ChartCache, close_pool, solve_rates_data, trends_data  # noqa: E402
+from bench_rescore import fill  # noqa: E402
+
+
+# Times drawing the history charts in the process pool against answering them from the cache, as /chart does
+async def run(args, directory: str):
+    store = HistoryStore()
+    fill(store, args.players, args.days, args.seed)
+    tracker = types.SimpleNamespace(game=CONNECTIONS, puzzle_number=args.days, players=types.SimpleNamespace(get_by_id=lambda user_id: None))
+    cache = ChartCache(directory)
+
+    async def prepare_trends() -> dict:
+        data = HistoryAnalytics(store, args.days - 29, args.days)
+        return await asyncio.to_thread(trends_data, tracker, data, 30)
+
+    async def prepare_solve_rates() -> dict:
+        return await asyncio.to_thread(solve_rates_data, tracker, HistoryAnalytics(store))
+
+    for kind, prepare in (('trends', prepare_trends), ('solve_rates', prepare_solve_rates)):
+        timings = []
+        for label in ('first', 'after invalidation', 'cached'):
+            start = time.perf_counter()
+            await cache.get(kind, args.days, 'roster', prepare)
+            timings.append(f'{label} {(time.perf_counter() - start) * 1000:.2f} ms')
+            if label == 'first':
+                cache.invalidate()
+        print(f'{kind}: {", ".join(timings)}')
+    close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rendering charts against serving them from the chart cache.')
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not CHARTS_ENABLED:
+        print('Charts need matplotlib installed and CHARTS=1')
+        sys.exit(1)
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args, directory))
+
+
+if __name__ == '__main__':
+    main()
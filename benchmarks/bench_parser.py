@@ -0,0 +1,85 @@
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_parser import COLOR_SQUARES, parse_result  # noqa: E402
+from games import match_game  # noqa: E402
+
+CHAT = [
+    'anyone else think today was rough',
+    'lol',
+    'purple was evil today, no way I would have gotten that',
+    'https://www.nytimes.com/games/connections',
+    'gm everyone',
+    'the Connections today had a puzzle about rivers #geography',
+]
+
+
+def make_result(rng: random.Random, puzzle_number: int) -> str:
+    rows = []
+    colors = [0, 1, 2, 3]
+    rng.shuffle(colors)
+    mistakes = 0
+    while colors and mistakes < 4:
+        if rng.random() < 0.3:
+            rows.append(''.join(rng.choice(COLOR_SQUARES) for _ in range(4)))
+            mistakes += 1
+        else:
+            rows.append(COLOR_SQUARES[colors.pop()] * 4)
+    return f'Connections\nPuzzle #{puzzle_number}\n' + '\n'.join(rows)
+
+
+def make_malformed(rng: random.Random, puzzle_number: int) -> str:
+    result = make_result(rng, puzzle_number)
+    if rng.random() < 0.5:
+        return result.replace(f'#{puzzle_number}', '#abc')
+    return result + '\n🟨🟨'
+
+
+def make_corpus(size: int, chat_ratio: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < chat_ratio:
+            corpus.append(rng.choice(CHAT))
+        elif roll < chat_ratio + (1 - chat_ratio) * 0.9:
+            corpus.append(make_result(rng, rng.randint(1, 999)))
+        else:
+            corpus.append(make_malformed(rng, rng.randint(1, 999)))
+    return corpus
+
+
+def parse_all(corpus: list):
+    for content in corpus:
+        try:
+            parse_result(content)
+        except ValueError:
+            pass
+
+
+def dispatch_all(corpus: list):
+    # what on_message does: one search over every game's signature, then only that game's parser
+    for content in corpus:
+        game = match_game(content)
+        if game:
+            try:
+                game.parse(content)
+            except ValueError:
+                pass
+
+
+def main():
+    size = int(os.getenv('CORPUS_SIZE', '100000'))
+    for chat_ratio in (0.0, 0.5, 0.95):
+        corpus = make_corpus(size, chat_ratio)
+        for name, function in (('parse', parse_all), ('dispatch', dispatch_all)):
+            seconds = min(timeit.repeat(lambda: function(corpus), number=1, repeat=5))
+            print(f'{int(chat_ratio * 100):3}% chat, {name:8}: {size / seconds:12,.0f} messages/s ({seconds * 1e6 / size:.2f} us/message)')
+
+
+if __name__ == '__main__':
+    main()
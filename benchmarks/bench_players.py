@@ -0,0 +1,93 @@
+import os
+import sys
+import random
+import argparse
+import timeit
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from player_table import PlayerTable  # noqa: E402
+from registry import PlayerRegistry  # noqa: E402
+from leaderboard import Leaderboard, METRICS  # noqa: E402
+
+
+# the previous layout, one object with a __dict__ per player
+class DictPlayer():
+    def __init__(self, name, userId=None):
+        self.name = name
+        self.userId = userId
+        self.score = 0
+        self.winCount = 0
+        self.connectionCount = 0
+        self.subConnectionCount = 0
+        self.mistakeCount = 0
+        self.submissionCount = 0
+        self.totalGuessCount = 0
+        self.registered = True
+        self.silenced = False
+        self.completedToday = False
+        self.succeededToday = False
+
+
+def fill(player, rng: random.Random):
+    player.submissionCount = rng.randint(0, 500)
+    player.winCount = rng.randint(0, player.submissionCount)
+    player.connectionCount = rng.randint(0, player.submissionCount)
+    player.subConnectionCount = player.connectionCount * 4
+    player.mistakeCount = rng.randint(0, player.submissionCount * 4)
+    player.totalGuessCount = player.submissionCount * 4 + player.mistakeCount
+    player.score = rng.randint(0, 10)
+    player.completedToday = rng.random() < 0.8
+
+
+def measure_memory(make, count: int) -> float:
+    tracemalloc.start()
+    players = make(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del players
+    return size / count
+
+
+def make_dict_players(count: int) -> list:
+    return [DictPlayer(f'player{index}', index + 1) for index in range(count)]
+
+
+def make_table_players(count: int) -> tuple:
+    table = PlayerTable()
+    return table, [table.add(f'player{index}', index + 1) for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-player memory and time the vectorized player stats.')
+    parser.add_argument('--players', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{measure_memory(make_dict_players, args.players):.0f} bytes per player with a __dict__, '
+          f'{measure_memory(make_table_players, args.players):.0f} bytes per player in a PlayerTable')
+
+    rng = random.Random(args.seed)
+    table, players = make_table_players(args.players)
+    registry = PlayerRegistry()
+    for player in players:
+        fill(player, rng)
+        registry.add(player)
+    indices = np.array([player.index for player in players], dtype=np.intp)
+
+    stats_time = min(timeit.repeat(lambda: table.stats(indices), number=1, repeat=5))
+    print(f'stats for {args.players} players: {stats_time * 1000:.1f} ms')
+
+    leaderboard = Leaderboard()
+    rebuild_time = min(timeit.repeat(lambda: leaderboard.rebuild(players, table.stats(indices)), number=1, repeat=3))
+    incremental = Leaderboard()
+    update_time = min(timeit.repeat(lambda: incremental.update(*players), number=1, repeat=1))
+    same = all([entry[2] for entry in leaderboard.indexes[metric]] == [entry[2] for entry in incremental.indexes[metric]] for metric in METRICS)
+    print(f'leaderboard: {rebuild_time * 1000:.0f} ms rebuilt from stats, {update_time * 1000:.0f} ms updated player by player, same order: {same}')
+
+
+if __name__ == '__main__':
+    main()
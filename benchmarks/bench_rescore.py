@@ -0,0 +1,67 @@
+import os
+import sys
+import random
+import argparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore  # noqa: E402
+from analytics import HistoryAnalytics  # noqa: E402
+from scoring import DEFAULT_POLICY, ScoringPolicy, rescore  # noqa: E402
+
+
+def make_guesses(rng: random.Random) -> tuple:
+    # packed guesses like ParsedResult.guesses, a solved row is four squares of one color
+    guesses = []
+    colors = [0, 1, 2, 3]
+    rng.shuffle(colors)
+    mistakes = 0
+    while colors and mistakes < 4:
+        if rng.random() < 0.3:
+            guesses.append(rng.randrange(256))
+            mistakes += 1
+        else:
+            guesses.append(colors.pop() * 0b01010101)
+    return bytes(guesses), mistakes
+
+
+def fill(store: HistoryStore, players: int, days: int, seed: int):
+    rng = random.Random(seed)
+    for puzzle_number in range(1, days + 1):
+        for user_id in range(1, players + 1):
+            if rng.random() < 0.2:
+                continue
+            guesses, mistakes = make_guesses(rng)
+            solved = [guess & 3 for guess in guesses if guess == (guess & 3) * 0b01010101]
+            store.append(puzzle_number, user_id, guesses, mistakes, DEFAULT_POLICY.score(solved), puzzle_number * 86400)
+
+
+# Times a rescore of years of synthetic history from the in-memory columns, the part /rescore runs in a worker thread
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rescoring the submission history under another scoring policy.')
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--years', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    days = int(args.years * 365)
+    store = HistoryStore()
+    start = time.perf_counter()
+    fill(store, args.players, days, args.seed)
+    print(f'generated {len(store):,} submissions of {args.players} players over {days} days in {time.perf_counter() - start:.1f} s')
+
+    policy = ScoringPolicy(DEFAULT_POLICY.version + 1, (1, 1, 2, 3), 'top_completed')
+    start = time.perf_counter()
+    data = HistoryAnalytics(store)
+    columns = time.perf_counter() - start
+    start = time.perf_counter()
+    result = rescore(data, DEFAULT_POLICY, policy, days, True)
+    elapsed = time.perf_counter() - start
+    print(f'columns built in {columns * 1000:.0f} ms, rescored in {elapsed * 1000:.0f} ms ({len(store) / elapsed:,.0f} submissions/s)')
+    print(f'{result.changed_places:,} daily places and {result.changed_days:,} days of winners change, '
+          f'{int((result.old_wins != result.new_wins).sum())} of {len(result.user_ids)} players get other win counts')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import types
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_parser import CHAT, make_result  # noqa: E402
+
+
+def memory_kib() -> tuple:
+    # current and peak resident memory of this process
+    values = {}
+    with open('/proc/self/status', 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                values[line.split(':')[0]] = int(line.split()[1])
+    return values.get('VmRSS', 0), values.get('VmHWM', 0)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Stands in for Discord's REST API: every call takes a fixed latency and is recorded, nothing is rate limited
+class FakeRest():
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeUser():
+    def __init__(self, user_id: int, name: str):
+        self.id = user_id
+        self.name = name
+        self.bot = False
+        self.mention = f'<@{user_id}>'
+
+
+class FakeChannel():
+    def __init__(self, channel_id: int, guild_id: int, rest: FakeRest):
+        self.id = channel_id
+        self.name = f'channel-{channel_id}'
+        self.guild = types.SimpleNamespace(id=guild_id, members=[])
+        self.rest = rest
+        self.sent = 0
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.rest.call()
+        self.sent += 1
+
+
+class FakeMessage():
+    def __init__(self, message_id: int, channel: FakeChannel, author: FakeUser, content: str):
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.dispatched_at = None
+        self.answered_at = None  # when the last reaction or reply completed
+
+    async def add_reaction(self, emoji: str):
+        await self.channel.rest.call()
+        self.answered_at = time.perf_counter()
+
+    async def reply(self, content=None, **kwargs):
+        await self.channel.rest.call()
+        self.answered_at = time.perf_counter()
+
+
+def make_events(args, guilds: list, rng: random.Random) -> list:
+    # (seconds from the start, message or None for the midnight rollover), every player submits once before
+    # and once after midnight, some resubmit, and every channel has background chatter throughout
+    midnight = args.duration * args.midnight
+    events = [(midnight, None)]
+    message_id = 0
+    for channel, users in guilds:
+        for user in users:
+            for start, end, puzzle_number in ((0, midnight, args.puzzle), (midnight, args.duration, args.puzzle + 1)):
+                at = rng.uniform(start, end)
+                content = make_result(rng, puzzle_number)
+                message_id += 1
+                events.append((at, FakeMessage(message_id, channel, user, content)))
+                if rng.random() < args.duplicates:
+                    message_id += 1
+                    events.append((rng.uniform(at, end), FakeMessage(message_id, channel, user, content)))
+        for _ in range(int(args.chatter * args.duration)):
+            message_id += 1
+            events.append((rng.uniform(0, args.duration), FakeMessage(message_id, channel, rng.choice(users), rng.choice(CHAT))))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+async def run(args) -> int:
+    import ConnectionsTracker as ct
+    from reactions import ReactionDispatcher
+    from broadcast import Broadcaster
+
+    client = ct.client
+    rest = FakeRest(args.rest_ms / 1000)
+    channels = {}
+    client.get_channel = lambda channel_id: channels.get(channel_id)
+    client.reactions = ReactionDispatcher(os.getenv('FEEDBACK_MODE', 'reactions'), rate=args.reaction_rate, burst=args.reaction_burst, concurrency=args.concurrency)
+    client.broadcaster = Broadcaster(rate=args.send_rate, burst=args.reaction_burst)
+    await client.load_trackers()
+
+    rng = random.Random(args.seed)
+    guilds = []
+    for index in range(args.guilds):
+        guild_id = (index + 1) << 22
+        tracker = await client.get_tracker(ct.tracker_key(guild_id, guild_id + 1))
+        channel = channels[guild_id + 1] = FakeChannel(guild_id + 1, guild_id, rest)
+        tracker.text_channel = channel
+        tracker.puzzle_number = args.puzzle
+        users = [FakeUser(guild_id + 2 + number, f'player{number}') for number in range(args.players)]
+        for user in users:
+            tracker.add_player(tracker.new_player(user.name, user.id))
+        tracker.save_players()
+        tracker.save_state()
+        guilds.append((channel, users))
+    events = make_events(args, guilds, rng)
+    await asyncio.gather(*(tracker.persistence.flush() for tracker in client.trackers.values()))
+    rss_before, _ = memory_kib()
+
+    tasks = []
+    midnight_elapsed = None
+    start = time.perf_counter()
+
+    async def rollover():
+        nonlocal midnight_elapsed
+        rollover_start = time.perf_counter()
+        await asyncio.gather(*(ct.midnight_job(key) for key in list(client.trackers)))
+        midnight_elapsed = time.perf_counter() - rollover_start
+
+    for at, message in events:
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if message is None:
+            tasks.append(asyncio.create_task(rollover()))
+            continue
+        message.dispatched_at = time.perf_counter()
+        # discord.py runs every event handler in its own task, so do the same
+        tasks.append(asyncio.create_task(ct.on_message(message)))
+    dispatched = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    writes = sum(tracker.persistence.writes for tracker in client.trackers.values())
+    avoided = sum(tracker.persistence.writes_avoided for tracker in client.trackers.values())
+    for tracker in list(client.trackers.values()):
+        await tracker.close()
+    final_writes = sum(tracker.persistence.writes for tracker in client.trackers.values()) - writes
+    client.ledger.close()
+    rss, peak = memory_kib()
+
+    messages = [message for _, message in events if message is not None]
+    latencies = [(message.answered_at - message.dispatched_at) * 1000 for message in messages if message.answered_at]
+    rolled_over = sum(1 for tracker in client.trackers.values() if tracker.puzzle_number == args.puzzle + 1)
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    print(f'{len(messages)} messages ({len(latencies)} answered submissions) over {args.guilds} guilds of {args.players} players, '
+          f'dispatched in {dispatched:.2f} s, all handled after {elapsed:.2f} s: {len(messages) / elapsed:,.0f} messages/s')
+    print(f'message to last reaction: p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {max(latencies, default=0):.1f} ms')
+    print(f'midnight rollover of {args.guilds} trackers took {(midnight_elapsed or 0) * 1000:.0f} ms, {rolled_over} of {args.guilds} rolled over')
+    print(f'persistence: {writes} coalesced writes during the run ({avoided} avoided), {final_writes} on shutdown, {rest.calls} REST calls')
+    print(f'memory: {rss_before / 1024:.1f} MiB resident before the run, {rss / 1024:.1f} MiB after, {peak / 1024:.1f} MiB peak')
+
+    failed = []
+    if args.max_p99 is not None and p99 > args.max_p99:
+        failed.append(f'p99 latency {p99:.1f} ms is above {args.max_p99} ms')
+    if args.min_throughput is not None and len(messages) / elapsed < args.min_throughput:
+        failed.append(f'throughput {len(messages) / elapsed:.0f} messages/s is below {args.min_throughput}')
+    if rolled_over != args.guilds:
+        failed.append(f'only {rolled_over} of {args.guilds} trackers rolled over')
+    for reason in failed:
+        print(f'FAILED: {reason}')
+    return 1 if failed else 0
+
+
+# Drives on_message of the real client with synthetic submissions and chatter around a midnight rollover,
+# against fake channels and messages instead of a gateway, and reports throughput, latency, writes and memory.
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot against an in-process fake Discord.')
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--players', type=int, default=100, help='players per guild')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to spread the messages over, 0 sends them all at once')
+    parser.add_argument('--midnight', type=float, default=0.5, help='when midnight falls, as a fraction of the duration')
+    parser.add_argument('--chatter', type=float, default=5.0, help='chat messages per second per channel')
+    parser.add_argument('--duplicates', type=float, default=0.05, help='fraction of submissions that are sent twice')
+    parser.add_argument('--rest-ms', type=float, default=10.0, help='latency of every fake REST call')
+    parser.add_argument('--reaction-rate', type=float, default=1000.0, help='reactions per second per channel, Discord allows about 4')
+    parser.add_argument('--reaction-burst', type=int, default=50)
+    parser.add_argument('--send-rate', type=float, default=1000.0, help='scoreboard and ping messages per second per channel, Discord allows about 1')
+    parser.add_argument('--concurrency', type=int, default=8, help='REST calls in flight at once, as in ReactionDispatcher')
+    parser.add_argument('--puzzle', type=int, default=500)
+    parser.add_argument('--max-p99', type=float, help='fail if the p99 latency in ms is above this')
+    parser.add_argument('--min-throughput', type=float, help='fail if fewer messages per second were handled')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        os.environ.setdefault('TRACKER_DIR', 'trackers')
+        # the midnight scoreboard would otherwise time rendering its chart along with the messages
+        os.environ.setdefault('CHARTS', '0')
+        status = asyncio.run(run(args))
+        os.chdir(ROOT)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
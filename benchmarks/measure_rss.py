@@ -0,0 +1,66 @@
+import os
+import sys
+import asyncio
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiles import PROFILES  # noqa: E402
+
+
+def rss_kib() -> int:
+    with open('/proc/self/status', 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def make_guild(guild_id: int, members: int) -> dict:
+    # what the gateway would send for a large guild: every member plus an online presence for a third of them
+    return {
+        'id': str(guild_id),
+        'name': 'Synthetic Guild',
+        'member_count': members,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0,
+                   'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [{'id': str(guild_id + 1), 'type': 0, 'name': 'connections', 'position': 0, 'permission_overwrites': []}],
+        'members': [{'user': {'id': str(10**17 + index), 'username': f'member{index}', 'discriminator': '0', 'avatar': None, 'global_name': f'Member {index}'},
+                     'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False, 'flags': 0}
+                    for index in range(members)],
+        'presences': [{'user': {'id': str(10**17 + index)}, 'status': 'online', 'activities': [], 'client_status': {'desktop': 'online'}}
+                      for index in range(0, members, 3)],
+    }
+
+
+async def measure(profile: str, members: int):
+    from discord import Client
+    from profiles import client_options
+
+    options = client_options(profile)
+    client = Client(**options)
+    state = client._connection
+    # only deliver what the profile's intents would have, the payload is built before measuring so only the cache is counted
+    guild = make_guild(1000, members)
+    if not options['intents'].members:
+        guild['members'] = []
+    if not options['intents'].presences:
+        guild['presences'] = []
+    before = rss_kib()
+    state._add_guild_from_data(guild)
+    after = rss_kib()
+    print(f'{profile:>5}: {len(client.users):8} cached users, {after - before:8} KiB resident for the synthetic guild')
+
+
+def main():
+    members = int(os.getenv('GUILD_MEMBERS', '100000'))
+    if len(sys.argv) > 1:
+        asyncio.run(measure(sys.argv[1], members))
+        return
+    # each profile runs in a fresh interpreter so one can't inflate the other
+    for profile in PROFILES:
+        subprocess.run([sys.executable, os.path.abspath(__file__), profile], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import queue
+import random
+import asyncio
+import logging
+import argparse
+import datetime
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeChannel():
+    def __init__(self, channel_id: int, sent: list):
+        self.id = channel_id
+        self.name = f'channel-{channel_id}'
+        self.sent = sent
+
+    async def send(self, content=None, embed=None):
+        self.sent.append((self.id, embed.title if embed else content))
+
+
+def make_trackers(directory: str, count: int, players: int, seed: int) -> list:
+    # a tracker per synthetic guild that missed nothing yet, with half of its players done for the day
+    from storage import open_storage, PLAYER_DEFAULTS
+
+    rng = random.Random(seed)
+    yesterday = datetime.datetime.now().astimezone() - datetime.timedelta(days=1)
+    keys = []
+    for _ in range(count):
+        guild_id = rng.randrange(1 << 40, 1 << 62)
+        os.makedirs(os.path.join(directory, 'trackers', str(guild_id)))
+        storage = open_storage('sqlite', os.path.join(directory, 'trackers', str(guild_id)))
+        storage.save_state({'text_channel': guild_id + 1, 'guild_id': guild_id, 'puzzle_number': 100,
+                            'last_scored': yesterday.isoformat(), 'scored_today': False})
+        storage.save_players({str(index + 1): {**PLAYER_DEFAULTS, 'name': f'player{index}', 'userId': index + 1, 'score': index % 5, 'completedToday': index % 2 == 0}
+                              for index in range(players)})
+        storage.close()
+        keys.append(guild_id)
+    return keys
+
+
+async def simulate(shard_ids: list, overlap: bool) -> dict:
+    import ConnectionsTracker as ct
+
+    client = ct.client
+    sent = []
+    client.get_channel = lambda channel_id: FakeChannel(channel_id, sent)
+    await client.load_trackers()
+    owned = [key for key, state in client.tracker_states.items() if client.owns(key, state)]
+    # with overlap every process also tries every other shard's jobs, as if ownership was misconfigured
+    keys = list(client.tracker_states) if overlap else owned
+    start = time.perf_counter()
+    await asyncio.gather(*(ct.warning_job(key) for key in keys))
+    await asyncio.gather(*(ct.midnight_job(key) for key in keys))
+    elapsed = time.perf_counter() - start
+    for tracker in list(client.trackers.values()):
+        await tracker.close()
+    client.ledger.close()
+    return {'shards': shard_ids, 'owned': len(owned), 'attempted': len(keys), 'elapsed': elapsed,
+            'rollovers': sum(1 for _, title in sent if title and title.startswith("It's time")),
+            'messages': len(sent)}
+
+
+def run_worker(directory: str, shard_ids: list, shard_count: int, overlap: bool, results):
+    os.chdir(directory)
+    os.environ.update({'SHARDS': str(shard_count), 'SHARD_IDS': ','.join(map(str, shard_ids)),
+                       'TRACKER_DIR': 'trackers', 'STORAGE_BACKEND': 'sqlite', 'PERSIST_DELAY': '0', 'CHARTS': '0'})
+    logging.getLogger("Connections Tracker").disabled = True
+    results.put(asyncio.run(simulate(shard_ids, overlap)))
+
+
+# Runs the midnight jobs of many synthetic guilds in several worker processes sharing one tracker directory,
+# each process owning some of the shards like a real multi-process deployment, and checks every guild rolled over once.
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a sharded multi-process deployment without a gateway.')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--shards-per-process', type=int, default=2)
+    parser.add_argument('--guilds', type=int, default=200)
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--overlap', action='store_true', help='have every process attempt every guild\'s jobs')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    shard_count = args.processes * args.shards_per_process
+    with tempfile.TemporaryDirectory() as directory:
+        keys = make_trackers(directory, args.guilds, args.players, args.seed)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        workers = [context.Process(target=run_worker, args=(directory, list(range(index, shard_count, args.processes)), shard_count, args.overlap, results))
+                   for index in range(args.processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        reports = []
+        while len(reports) < len(workers):
+            try:
+                reports.append(results.get(timeout=1))
+            except queue.Empty:
+                if any(worker.exitcode for worker in workers):
+                    raise SystemExit('A worker process failed')
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        from storage import open_storage
+        puzzle_numbers = []
+        for key in keys:
+            storage = open_storage('sqlite', os.path.join(directory, 'trackers', str(key)))
+            puzzle_numbers.append(storage.load_state()['puzzle_number'])
+            storage.close()
+
+    for report in sorted(reports, key=lambda report: report['shards']):
+        print(f'shards {report["shards"]}: owns {report["owned"]} guilds, attempted {report["attempted"]}, '
+              f'{report["rollovers"]} rollovers and {report["messages"]} messages in {report["elapsed"] * 1000:.0f} ms')
+    rollovers = sum(report['rollovers'] for report in reports)
+    print(f'{args.guilds} guilds over {shard_count} shards in {args.processes} processes, {elapsed:.1f} s total')
+    print(f'{rollovers} rollovers, every guild rolled over exactly once: {rollovers == args.guilds and all(number == 101 for number in puzzle_numbers)}')
+
+
+if __name__ == '__main__':
+    main()
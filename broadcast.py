@@ -0,0 +1,162 @@
+import os
+import asyncio
+import logging
+import datetime
+
+import aiohttp
+from discord import Embed, File, HTTPException
+
+from reactions import TokenBucket
+from metrics import metrics
+
+logger = logging.getLogger("Connections Tracker")
+
+# Discord's limits on a single message
+MESSAGE_LIMIT = 2000
+EMBED_FIELDS = 25
+EMBED_LIMIT = 6000  # title, field names and field values together
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+
+# failures after which the message may or may not have been posted
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def chunk_mentions(mentions: list, template: str, limit: int = MESSAGE_LIMIT) -> list:
+    # messages with template's {mentions} filled by as many mentions as fit, no message when there is nobody to mention
+    room = limit - len(template.replace('{mentions}', ''))
+    chunks = []
+    current = ''
+    for mention in mentions:
+        if current and len(current) + 1 + len(mention) > room:
+            chunks.append(template.replace('{mentions}', current))
+            current = ''
+        current = f'{current} {mention}' if current else mention
+    if current:
+        chunks.append(template.replace('{mentions}', current))
+    return chunks
+
+
+def chunk_embeds(title: str, fields: list, color=None) -> list:
+    # embeds of at most EMBED_FIELDS (name, value) fields each, numbered in the title when there is more than one
+    groups = [[]]
+    size = 0
+    for name, value in fields:
+        name = truncate(str(name), FIELD_NAME_LIMIT)
+        value = truncate(str(value), FIELD_VALUE_LIMIT)
+        # leave room for the numbering added to the title
+        if len(groups[-1]) == EMBED_FIELDS or len(title) + 16 + size + len(name) + len(value) > EMBED_LIMIT:
+            groups.append([])
+            size = 0
+        groups[-1].append((name, value))
+        size += len(name) + len(value)
+    embeds = []
+    for number, group in enumerate(groups, 1):
+        embed = Embed(title=title if len(groups) == 1 else f'{title} ({number}/{len(groups)})', color=color)
+        for name, value in group:
+            embed.add_field(name=name, value=value, inline=False)
+        embeds.append(embed)
+    return embeds
+
+
+def attach(part: dict) -> dict:
+    # a part's 'file' is a path, opened for each attempt since discord.py closes a File once it was sent
+    filename = part.get('file')
+    if filename is None:
+        return part
+    return {**part, 'file': File(filename, filename=os.path.basename(filename))}
+
+
+def matches(message, part: dict) -> bool:
+    # whether a message in the channel is this part, going by its text and embed title
+    embed = part.get('embed')
+    return (message.author.bot and message.content.strip() == (part.get('content') or '').strip()
+            and [sent.title for sent in message.embeds] == ([embed.title] if embed else []))
+
+
+# Sends messages made of several parts, e.g. a scoreboard split over a few embeds. Parts for one channel are sent
+# one after another through a token bucket, so they arrive in order and a large roster stays under Discord's rate limits.
+# A part whose send failed in a way that may still have posted it is looked up in the channel before it is retried,
+# so a retry never posts it twice.
+class Broadcaster():
+    def __init__(self, rate: float = 1.0, burst: int = 5, dm_rate: float = 1.0, dm_burst: int = 5, attempts: int = 4, backoff: float = 2.0):
+        self.rate = rate
+        self.burst = burst
+        self.attempts = attempts
+        self.backoff = backoff
+        self.buckets = {}
+        self.locks = {}
+        self.dm_bucket = TokenBucket(dm_rate, dm_burst)  # DMs to different users share one budget
+
+    def get_bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.buckets[channel_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def send(self, channel, parts: list):
+        # parts are keyword arguments for channel.send, except that a file is given by its path.
+        # Raises if a part can't be sent and skips the ones after it.
+        lock = self.locks.setdefault(channel.id, asyncio.Lock())
+        bucket = self.get_bucket(channel.id)
+        async with lock:
+            for part in parts:
+                await self.deliver(channel, bucket, part)
+
+    async def deliver(self, channel, bucket: TokenBucket, part: dict):
+        # a few seconds early, in case our clock is ahead of Discord's
+        started = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=5)
+        for attempt in range(1, self.attempts + 1):
+            await bucket.acquire()
+            try:
+                with metrics.time('discord_request_seconds', call='send'):
+                    await channel.send(**attach(part))
+                metrics.inc('broadcast_messages')
+                return
+            except HTTPException as e:
+                # rate limits are retried by discord.py, other client errors won't go away by trying again
+                if e.status < 500:
+                    raise
+                error = e
+            except TRANSIENT_ERRORS as e:
+                error = e
+            if await self.delivered(channel, part, started):
+                logger.info(f'A message to channel {channel.id} was posted although sending it failed: {error}')
+                metrics.inc('broadcast_deduplicated')
+                return
+            if attempt == self.attempts:
+                raise error
+            logger.info(f'Failed to send a message to channel {channel.id} (attempt {attempt} of {self.attempts}), retrying: {error}')
+            metrics.inc('broadcast_retries')
+            await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+    async def delivered(self, channel, part: dict, since: datetime.datetime) -> bool:
+        try:
+            async for message in channel.history(limit=20, after=since):
+                if matches(message, part):
+                    return True
+        except (HTTPException, *TRANSIENT_ERRORS) as e:
+            logger.info(f'Could not check whether a message was posted to channel {channel.id}: {e}')
+        return False
+
+    async def send_direct(self, open_dm, user_ids: list, content: str, batch: int = 5) -> list:
+        # DMs content to each user, a batch at a time, and returns the ids that couldn't be reached (e.g. DMs turned off)
+        failed = []
+
+        async def send_one(user_id: int):
+            try:
+                await self.dm_bucket.acquire()
+                channel = await open_dm(user_id)
+                await self.send(channel, [{'content': content}])
+            except Exception as e:
+                logger.info(f'Failed to send a direct message to user {user_id}: {e}')
+                metrics.inc('direct_message_failures')
+                failed.append(user_id)
+
+        for start in range(0, len(user_ids), batch):
+            await asyncio.gather(*(send_one(user_id) for user_id in user_ids[start:start + batch]))
+        return failed
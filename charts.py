@@ -0,0 +1,193 @@
+import os
+import asyncio
+import hashlib
+import logging
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from metrics import metrics
+
+logger = logging.getLogger("Connections Tracker")
+
+CHART_KINDS = ('leaderboard', 'scoreboard', 'trends', 'solve_rates')
+COLOR_NAMES = ('Yellow', 'Green', 'Blue', 'Purple')
+PLOT_COLORS = ('#f9df6d', '#a0c35a', '#b0c4ef', '#ba81c5')
+
+# matplotlib is optional, without it (or with CHARTS=0) every chart option answers with text only
+CHARTS_ENABLED = os.getenv('CHARTS', '1') == '1' and importlib.util.find_spec('matplotlib') is not None
+CHART_ROWS = 15  # players in a bar chart or heatmap
+TREND_LINES = 8
+
+pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    # spawned rather than forked, the bot has threads running that a fork would copy mid-flight
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=int(os.getenv('CHART_WORKERS', '2')), mp_context=multiprocessing.get_context('spawn'))
+    return pool
+
+
+def close_pool():
+    global pool
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+
+
+def roster_hash(players) -> str:
+    # charts show names, so a rename or (de)registration needs a new chart even on the same day
+    return hashlib.sha1('\n'.join(sorted(player.name for player in players)).encode('utf-8')).hexdigest()[:12]
+
+
+# The data of each chart, built on the event loop or in a worker thread and pickled to the renderer
+def leaderboard_data(tracker) -> dict:
+    players = tracker.leaderboard.page('Wins', 0, CHART_ROWS, lambda player: player.registered)
+    return {'title': f'{tracker.game.title} Leaderboard', 'label': 'Wins',
+            'names': [player.name for player in players], 'values': [int(player.winCount) for player in players]}
+
+
+def scoreboard_data(tracker) -> dict:
+    players = sorted(tracker.players.completed, key=lambda player: -player.score)[:CHART_ROWS]
+    return {'title': f'Scoreboard for {tracker.game.title} #{tracker.puzzle_number}', 'label': 'Score',
+            'names': [player.name for player in players], 'values': [int(player.score) for player in players]}
+
+
+def player_name(tracker, user_id) -> str:
+    player = tracker.players.get_by_id(int(user_id))
+    return player.name if player else str(user_id)
+
+
+def trends_data(tracker, data, window: int) -> dict:
+    # running total of daily scores over the window for the players who submitted most in it
+    puzzles = list(range(tracker.puzzle_number - window + 1, tracker.puzzle_number + 1))
+    active = np.argsort(-data.submissions, kind='stable')[:TREND_LINES]
+    grid = np.zeros((len(data.user_ids), window), dtype=np.int64)
+    np.add.at(grid, (data.user_index, data.puzzles - puzzles[0]), data.scores)
+    return {'title': f'{tracker.game.title} points over the last {window} days', 'puzzles': puzzles,
+            'names': [player_name(tracker, data.user_ids[index]) for index in active],
+            'scores': np.cumsum(grid[active], axis=1).tolist()}
+
+
+def solve_rates_data(tracker, data) -> dict:
+    # percentage of each color solved by the players who submitted most
+    active = np.argsort(-data.submissions, kind='stable')[:CHART_ROWS]
+    rates = np.column_stack(list(data.solve_rates().values()))[active] * 100 if len(active) else np.zeros((0, 4))
+    return {'title': f'{tracker.game.title} solve rates', 'names': [player_name(tracker, data.user_ids[index]) for index in active],
+            'rates': rates.tolist()}
+
+
+# Runs in a pool process. data only holds lists and numbers so it pickles cheaply.
+def render_chart(kind: str, data: dict, filename: str):
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    rows = len(data.get('names', ())) or 1
+    figure = Figure(figsize=(8, max(3, 0.35 * rows + 1.5)), dpi=100)
+    axes = figure.subplots()
+    if not data['names']:
+        axes.text(0.5, 0.5, 'Nothing to show yet', ha='center', va='center', transform=axes.transAxes)
+        axes.set_axis_off()
+    elif kind in ('leaderboard', 'scoreboard'):
+        # best at the top
+        bars = axes.barh(data['names'][::-1], data['values'][::-1], color=PLOT_COLORS[1 if kind == 'scoreboard' else 2])
+        axes.bar_label(bars, padding=3)
+        axes.set_xlabel(data['label'])
+        axes.margins(x=0.1)
+    elif kind == 'trends':
+        figure.set_size_inches(8, 4.5)
+        for name, scores in zip(data['names'], data['scores']):
+            axes.plot(data['puzzles'], scores, marker='o', markersize=3, label=name)
+        axes.set_xlabel('Puzzle')
+        axes.set_ylabel('Score')
+        axes.legend(loc='upper left', fontsize='small', ncols=2)
+    elif kind == 'solve_rates':
+        image = axes.imshow(data['rates'], vmin=0, vmax=100, cmap='viridis', aspect='auto')
+        axes.set_xticks(range(len(COLOR_NAMES)), COLOR_NAMES)
+        axes.set_yticks(range(len(data['names'])), data['names'])
+        for row, rates in enumerate(data['rates']):
+            for column, rate in enumerate(rates):
+                axes.text(column, row, f'{rate:.0f}%', ha='center', va='center', color='white' if rate < 60 else 'black', fontsize='small')
+        figure.colorbar(image, ax=axes, label='% of submissions solved')
+    else:
+        raise ValueError(f'Unknown chart {kind}, expected one of {", ".join(CHART_KINDS)}')
+    axes.set_title(data['title'])
+    figure.tight_layout()
+    figure.savefig(f'{filename}.tmp', format='png')
+    os.replace(f'{filename}.tmp', filename)
+
+
+# Rendered charts of one tracker on disk, keyed by (chart, puzzle number, roster hash), so asking for the same chart
+# again costs an upload and no rendering. Submissions and tallies invalidate them, since those change what they show.
+# Invalidating only forgets the files, they are deleted off the event loop the next time a chart is needed.
+class ChartCache():
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.charts = {}  # (chart, puzzle number, roster hash) -> filename
+        self.rendering = {}  # same key -> task rendering it, so concurrent requests render once
+        self.stale = None  # filenames to delete, None until charts left by an earlier run were cleared
+        self.generation = 0  # bumped by every invalidation, so a render that started before one isn't cached
+
+    def invalidate(self):
+        if self.stale is not None:
+            self.stale.extend(self.charts.values())
+        self.charts.clear()
+        self.generation += 1
+
+    def remove_stale(self):
+        if self.stale is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # nothing says what data charts from an earlier run were rendered from
+            stale = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        else:
+            stale = self.stale
+        self.stale = []
+        for filename in stale:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # e.g. still being uploaded on Windows, try again next time
+                logger.info(f'Could not remove chart {filename}: {e}')
+                self.stale.append(filename)
+
+    async def get(self, kind: str, puzzle_number: int, roster: str, prepare) -> str:
+        # filename of the chart, rendering it from await prepare() if it isn't cached
+        key = (kind, puzzle_number, roster)
+        filename = self.charts.get(key)
+        if filename:
+            metrics.inc('charts', result='cached')
+            return filename
+        task = self.rendering.get(key)
+        if task is None:
+            task = self.rendering[key] = asyncio.ensure_future(self.render(key, prepare))
+            task.add_done_callback(lambda _: self.rendering.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def render(self, key: tuple, prepare) -> str:
+        kind, puzzle_number, roster = key
+        if self.stale is None or self.stale:
+            await asyncio.to_thread(self.remove_stale)
+        generation = self.generation
+        data = await prepare()
+        filename = os.path.join(self.directory, f'{kind}-{puzzle_number}-{roster}.png')
+        try:
+            with metrics.time('chart_seconds', chart=kind):
+                await asyncio.get_running_loop().run_in_executor(get_pool(), render_chart, kind, data, filename)
+        except BrokenProcessPool:
+            # a renderer died, e.g. killed for memory, the next chart starts new ones
+            close_pool()
+            raise
+        metrics.inc('charts', result='rendered')
+        if generation == self.generation:
+            self.charts[key] = filename
+        else:
+            # invalidated while rendering, it may show old data
+            self.stale.append(filename)
+        return filename
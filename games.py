@@ -0,0 +1,165 @@
+import re
+from typing import NamedTuple, Callable
+
+from result_parser import parse_result
+
+# Every game's result has a puzzle_number, guesses (at most history.MAX_GUESSES bytes, packed however the game
+# likes), guess_count, mistakes, succeeded, progress (groups or words found) and squares (reactions for what was solved).
+
+
+# A game the bot can track. The keyword is plain text every result of the game contains, and the signature a regular
+# expression starting at the keyword that only matches the game's results. Both are searched for all games at once.
+class Game(NamedTuple):
+    name: str  # used in tracker directories and command options, never changes
+    title: str
+    keyword: str
+    signature: str
+    parse: Callable  # content -> result, or None if it isn't a result after all. Raises ValueError for malformed results.
+    score: Callable  # (tracker, result) -> points for the day
+    url: str
+    thumbnail: str = None
+
+
+GAMES = {}
+KEYWORDS = None
+SIGNATURES = None
+
+
+def register_game(game: Game):
+    global KEYWORDS, SIGNATURES
+    if game.name in GAMES:
+        raise ValueError(f'Game {game.name} is already registered')
+    if not game.name.isidentifier():
+        raise ValueError(f'Game name {game.name!r} has to be a valid identifier')
+    GAMES[game.name] = game
+    KEYWORDS = re.compile('|'.join(re.escape(game.keyword) for game in GAMES.values()))
+    # one alternation with a named group per game, the group that matched names the game
+    SIGNATURES = re.compile('|'.join(f'(?P<{name}>{game.signature})' for name, game in GAMES.items()))
+
+
+def match_game(content: str) -> Game:
+    # the game whose signature shows up first in the message, or None for chat. Looking for the keywords is
+    # much cheaper than for the signatures, so chat is rejected by that and the signatures are only tried from there on.
+    keyword = KEYWORDS.search(content)
+    if keyword is None:
+        return None
+    match = SIGNATURES.search(content, keyword.start())
+    return GAMES[match.lastgroup] if match else None
+
+
+# Wordle: "Wordle 1,234 4/6*" followed by a row of five squares per guess
+WORDLE_SQUARES = {'⬛': 0, '⬜': 0, '🟨': 1, '🟦': 1, '🟩': 2, '🟧': 2}  # dark, light and high contrast themes
+WORDLE_HEADER = re.compile(r'Wordle\s+([\d,.]+)\s+([X1-6])/6')
+
+
+class WordleResult(NamedTuple):
+    puzzle_number: int
+    guesses: bytes  # one byte per guess, its five squares as base 3 digits (0 absent, 1 present, 2 correct)
+    mistakes: int
+    succeeded: bool
+
+    @property
+    def guess_count(self) -> int:
+        return len(self.guesses)
+
+    @property
+    def progress(self) -> int:
+        return int(self.succeeded)
+
+    @property
+    def squares(self) -> tuple:
+        return ()
+
+
+def parse_wordle(content: str) -> WordleResult:
+    header = WORDLE_HEADER.search(content)
+    if not header:
+        return None
+    puzzle_number = int(header.group(1).replace(',', '').replace('.', ''))
+    guesses = bytearray()
+    for line in content[header.end():].splitlines():
+        squares = [WORDLE_SQUARES.get(square) for square in line.strip()]
+        if not squares or None in squares:
+            continue
+        if len(squares) != 5:
+            raise ValueError(f'Guess row {line.strip()!r} does not have five squares')
+        guesses.append(sum(digit * 3 ** (4 - position) for position, digit in enumerate(squares)))
+    succeeded = header.group(2) != 'X'
+    if len(guesses) != (int(header.group(2)) if succeeded else 6):
+        raise ValueError(f'Result says {header.group(2)}/6 but has {len(guesses)} guess rows')
+    if succeeded != (guesses[-1] == 242):
+        raise ValueError('The last guess row does not match the result')
+    return WordleResult(puzzle_number, bytes(guesses), len(guesses) - succeeded, succeeded)
+
+
+# Strands: "Strands #123", the theme and rows of 🔵 (theme word), 🟡 (spangram) and 💡 (hint) in the order they happened
+STRANDS_SYMBOLS = {'🔵': 0, '🟡': 1, '💡': 2}
+STRANDS_HEADER = re.compile(r'Strands\s+#([\d,.]+)')
+
+
+class StrandsResult(NamedTuple):
+    puzzle_number: int
+    guesses: bytes  # the symbols as 2 bit codes, four to a byte with the first one in the high bits
+    guess_count: int  # symbols
+    mistakes: int  # hints used
+    spangram: int  # words found before the spangram
+
+    @property
+    def succeeded(self) -> bool:
+        # results are only shared once the puzzle is solved
+        return True
+
+    @property
+    def progress(self) -> int:
+        return self.guess_count - self.mistakes
+
+    @property
+    def squares(self) -> tuple:
+        return ('🟡',) if self.spangram == 0 else ()
+
+
+def parse_strands(content: str) -> StrandsResult:
+    header = STRANDS_HEADER.search(content)
+    if not header:
+        return None
+    symbols = []
+    for line in content[header.end():].splitlines():
+        line = ''.join(line.split())
+        codes = [STRANDS_SYMBOLS.get(symbol) for symbol in line]
+        if codes and None not in codes:
+            symbols.extend(codes)
+    if not symbols:
+        return None
+    if symbols.count(1) != 1:
+        raise ValueError('A Strands result has exactly one spangram')
+    if len(symbols) > 28:
+        raise ValueError('Strands result has too many symbols')
+    packed = bytearray()
+    for start in range(0, len(symbols), 4):
+        group = symbols[start:start + 4] + [0] * (4 - len(symbols[start:start + 4]))
+        packed.append(group[0] << 6 | group[1] << 4 | group[2] << 2 | group[3])
+    words = [symbol for symbol in symbols if symbol != 2]
+    return StrandsResult(int(header.group(1).replace(',', '').replace('.', '')), bytes(packed), len(symbols), symbols.count(2), words.index(1))
+
+
+def score_connections(tracker, result) -> int:
+    # versioned, see scoring.py and /rescore
+    return tracker.policy.score(result.solve_order)
+
+
+def score_wordle(tracker, result) -> int:
+    # 6 points for a first guess solve down to 1 for the sixth guess
+    return 7 - len(result.guesses) if result.succeeded else 0
+
+
+def score_strands(tracker, result) -> int:
+    # a point per word, two more for finding the spangram first, and a point off per hint
+    return max(0, result.progress + (2 if result.spangram == 0 else 0) - result.mistakes)
+
+
+CONNECTIONS = Game('connections', 'Connections', 'Connections', r'Connections\s+Puzzle\s+#', parse_result, score_connections,
+                   'https://www.nytimes.com/games/connections',
+                   'https://static01.nyt.com/images/2023/08/25/crosswords/alpha-connections-icon-original/alpha-connections-icon-original-smallSquare252.png?format=pjpg&quality=75&auto=webp&disable=upscale')
+register_game(CONNECTIONS)
+register_game(Game('wordle', 'Wordle', 'Wordle', WORDLE_HEADER.pattern, parse_wordle, score_wordle, 'https://www.nytimes.com/games/wordle'))
+register_game(Game('strands', 'Strands', 'Strands', STRANDS_HEADER.pattern, parse_strands, score_strands, 'https://www.nytimes.com/games/strands'))
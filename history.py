@@ -0,0 +1,276 @@
+import os
+import sys
+import zlib
+import struct
+import logging
+import threading
+from array import array
+from typing import NamedTuple
+
+logger = logging.getLogger("Connections Tracker")
+
+# column name -> array typecode, guesses are stored separately as one flat byte column
+COLUMNS = {
+    'puzzle_number': 'I',
+    'user_id': 'Q',
+    'guess_count': 'B',
+    'mistakes': 'B',
+    'score': 'B',
+    'timestamp': 'I',
+}
+MAX_GUESSES = 7  # four mistakes end the game, so at most three solves plus four mistakes
+JOURNAL_RECORD = struct.Struct(f'<IQBBBI{MAX_GUESSES}s')
+SEGMENT_MAGIC = b'CTH1'
+SEGMENT_HEADER = struct.Struct('<4sII')
+SEGMENT_ROWS = 65536
+
+
+class HistoryRow(NamedTuple):
+    puzzle_number: int
+    user_id: int
+    guesses: bytes  # one byte per guess in the same packing as ParsedResult.guesses
+    mistakes: int
+    score: int
+    timestamp: int
+
+
+def journal_record(row: HistoryRow) -> bytes:
+    return JOURNAL_RECORD.pack(row.puzzle_number, row.user_id, len(row.guesses), row.mistakes, row.score, row.timestamp, row.guesses)
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+# Column-oriented block of submissions, each column is a typed array
+class Segment():
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.guesses = array('B')
+        self.guess_offsets = array('I', [0])
+
+    def __len__(self):
+        return len(self.columns['puzzle_number'])
+
+    def append(self, row: HistoryRow):
+        for name, value in zip(COLUMNS, (row.puzzle_number, row.user_id, len(row.guesses), row.mistakes, row.score, row.timestamp)):
+            self.columns[name].append(value)
+        self.guesses.frombytes(row.guesses)
+        self.guess_offsets.append(len(self.guesses))
+
+    def row(self, index: int) -> HistoryRow:
+        columns = self.columns
+        guesses = self.guesses[self.guess_offsets[index]:self.guess_offsets[index + 1]].tobytes()
+        return HistoryRow(columns['puzzle_number'][index], columns['user_id'][index], guesses,
+                          columns['mistakes'][index], columns['score'][index], columns['timestamp'][index])
+
+    def puzzle_range(self) -> tuple:
+        puzzles = self.columns['puzzle_number']
+        return (min(puzzles), max(puzzles)) if puzzles else (0, -1)
+
+    def to_bytes(self) -> bytes:
+        parts = [SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(self), len(self.guesses))]
+        for values in (*self.columns.values(), self.guesses):
+            data = zlib.compress(to_little_endian(values), 9)
+            parts.append(struct.pack('<I', len(data)))
+            parts.append(data)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        magic, rows, guess_total = SEGMENT_HEADER.unpack_from(data)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError('Not a history segment')
+        segment = cls()
+        offset = SEGMENT_HEADER.size
+        for name, typecode in (*COLUMNS.items(), ('guesses', 'B')):
+            (length,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            values = from_little_endian(typecode, zlib.decompress(data[offset:offset + length]))
+            offset += length
+            if name == 'guesses':
+                segment.guesses = values
+            else:
+                segment.columns[name] = values
+        if len(segment) != rows or len(segment.guesses) != guess_total:
+            raise ValueError('History segment is truncated')
+        total = 0
+        for count in segment.columns['guess_count']:
+            total += count
+            segment.guess_offsets.append(total)
+        return segment
+
+
+# Append-only submission history. Each segment is journaled to its own file as rows arrive,
+# once full it is sealed into a compressed columnar segment file and its journal is removed.
+class HistoryStore():
+    def __init__(self, directory: str = 'history'):
+        self.directory = directory
+        self.sealed = []
+        self.unsealed = []  # (index, segment) that are full but not yet written as segment files
+        self.active = Segment()
+        self.active_index = 1
+        self.pending = []  # (journal index, packed record)
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()  # flush and rewrite don't touch the files at the same time
+
+    def _path(self, kind: str, index: int) -> str:
+        return os.path.join(self.directory, f'{kind}-{index:06}.bin')
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        filenames = sorted(os.listdir(self.directory))
+        for filename in filenames:
+            if filename.startswith('segment-') and filename.endswith('.bin'):
+                with open(os.path.join(self.directory, filename), 'rb') as file:
+                    self.sealed.append(Segment.from_bytes(file.read()))
+                self.active_index = int(filename[8:14]) + 1
+        for filename in filenames:
+            if not (filename.startswith('journal-') and filename.endswith('.bin')):
+                continue
+            index = int(filename[8:14])
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(self._path('segment', index)):
+                # sealed before the journal could be removed
+                os.remove(path)
+                continue
+            with open(path, 'rb') as file:
+                data = file.read()
+            complete = len(data) - len(data) % JOURNAL_RECORD.size
+            segment = Segment()
+            for record in JOURNAL_RECORD.iter_unpack(data[:complete]):
+                puzzle_number, user_id, guess_count, mistakes, score, timestamp, guesses = record
+                segment.append(HistoryRow(puzzle_number, user_id, guesses[:guess_count], mistakes, score, timestamp))
+            if complete != len(data):
+                logger.info(f'Dropping partial record at the end of {path}')
+                with open(path, 'r+b') as file:
+                    file.truncate(complete)
+            if len(segment) >= SEGMENT_ROWS:
+                self.unsealed.append((index, segment))
+                self.active_index = index + 1
+            else:
+                self.active = segment
+                self.active_index = index
+        logger.info(f'Loaded {len(self)} history rows from {len(self.sealed)} sealed segments')
+
+    def __len__(self):
+        segments = [*self.sealed, *(segment for _, segment in self.unsealed), self.active]
+        return sum(len(segment) for segment in segments)
+
+    def append(self, puzzle_number: int, user_id: int, guesses: bytes, mistakes: int, score: int, timestamp: int):
+        if len(guesses) > MAX_GUESSES:
+            raise ValueError(f'A submission can have at most {MAX_GUESSES} guesses')
+        row = HistoryRow(puzzle_number, user_id, bytes(guesses), mistakes, score, int(timestamp))
+        record = journal_record(row)
+        with self.lock:
+            self.active.append(row)
+            self.pending.append((self.active_index, record))
+            if len(self.active) >= SEGMENT_ROWS:
+                self.unsealed.append((self.active_index, self.active))
+                self.active = Segment()
+                self.active_index += 1
+
+    def flush(self):
+        # does blocking file I/O, call it from a worker thread
+        with self.file_lock:
+            self._flush()
+
+    def _flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            unsealed = list(self.unsealed)
+        journals = {}
+        for index, record in pending:
+            journals.setdefault(index, []).append(record)
+        for index, records in journals.items():
+            with open(self._path('journal', index), 'ab') as file:
+                file.write(b''.join(records))
+                file.flush()
+                os.fsync(file.fileno())
+        for index, segment in unsealed:
+            filename = self._path('segment', index)
+            with open(f'{filename}.tmp', 'wb') as file:
+                file.write(segment.to_bytes())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(f'{filename}.tmp', filename)
+            os.remove(self._path('journal', index))
+            with self.lock:
+                self.unsealed.remove((index, segment))
+                self.sealed.append(segment)
+            logger.info(f'Sealed history segment {filename} with {len(segment)} rows')
+
+    def set_scores(self, scores):
+        # replaces the score of every row, in the order segments() returns them. Call rewrite() to save them.
+        with self.lock:
+            offset = 0
+            for segment in [*self.sealed, *(segment for _, segment in self.unsealed), self.active]:
+                segment.columns['score'] = array('B', scores[offset:offset + len(segment)])
+                offset += len(segment)
+            if offset != len(scores):
+                raise ValueError(f'Got {len(scores)} scores for {offset} history rows')
+
+    def rewrite(self):
+        # writes every segment and journal again from memory, e.g. after set_scores. Call it from a worker thread.
+        with self.file_lock:
+            with self.lock:
+                # sealed segments were loaded and written in file name order
+                indexes = sorted(int(filename[8:14]) for filename in os.listdir(self.directory) if filename.startswith('segment-') and filename.endswith('.bin'))
+                sealed = list(zip(indexes, self.sealed))
+                # unsealed and active segments are journals, the pending records are part of them
+                journals = {index: b''.join(journal_record(segment.row(position)) for position in range(len(segment)))
+                            for index, segment in [*self.unsealed, (self.active_index, self.active)]}
+                self.pending = []
+            for index, segment in sealed:
+                filename = self._path('segment', index)
+                with open(f'{filename}.tmp', 'wb') as file:
+                    file.write(segment.to_bytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(f'{filename}.tmp', filename)
+            for index, data in journals.items():
+                filename = self._path('journal', index)
+                with open(f'{filename}.tmp', 'wb') as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(f'{filename}.tmp', filename)
+        logger.info(f'Rewrote {len(self)} history rows in {self.directory}')
+
+    def segments(self, first_puzzle: int = None, last_puzzle: int = None) -> list:
+        # segments that may contain rows in the puzzle range
+        with self.lock:
+            segments = [*self.sealed, *(segment for _, segment in self.unsealed), self.active]
+        if first_puzzle is None and last_puzzle is None:
+            return segments
+        selected = []
+        for segment in segments:
+            low, high = segment.puzzle_range()
+            if (last_puzzle is None or low <= last_puzzle) and (first_puzzle is None or high >= first_puzzle):
+                selected.append(segment)
+        return selected
+
+    def rows(self, first_puzzle: int = None, last_puzzle: int = None, user_id: int = None):
+        for segment in self.segments(first_puzzle, last_puzzle):
+            puzzles = segment.columns['puzzle_number']
+            users = segment.columns['user_id']
+            for index in range(len(segment)):
+                if first_puzzle is not None and puzzles[index] < first_puzzle:
+                    continue
+                if last_puzzle is not None and puzzles[index] > last_puzzle:
+                    continue
+                if user_id is not None and users[index] != user_id:
+                    continue
+                yield segment.row(index)
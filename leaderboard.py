@@ -0,0 +1,158 @@
+from bisect import bisect_left, insort
+from itertools import count, islice
+import numpy as np
+
+
+def get_score(player):
+    return player.score
+
+
+def get_wins(player):
+    return player.winCount
+
+
+def get_con_submissions(player):
+    return player.submissionCount
+
+
+def get_tot_guesses(player):
+    return player.totalGuessCount
+
+
+def get_cons(player):
+    return player.connectionCount
+
+
+def get_sub_cons(player):
+    return player.subConnectionCount
+
+
+def get_mistakes(player):
+    return player.mistakeCount
+
+
+# players without submissions count as 0 rather than dividing by zero
+def get_win_percent(player):
+    if not player.submissionCount:
+        return 0.0
+    return ((player.winCount / player.submissionCount) * 100)
+
+
+def get_avg_guesses(player):
+    if not player.submissionCount:
+        return 0.0
+    return (player.totalGuessCount / player.submissionCount)
+
+
+def get_average_mistakes(player):
+    if not player.submissionCount:
+        return 0.0
+    return (player.mistakeCount / player.submissionCount)
+
+
+def get_completion_percent(player):
+    if not player.submissionCount:
+        return 0.0
+    return ((player.connectionCount / player.submissionCount) * 100)
+
+
+# stat name -> (key function, whether higher is better)
+METRICS = {
+    'Win %': (get_win_percent, True),
+    'Wins': (get_wins, True),
+    'Submissions': (get_con_submissions, True),
+    'Avg. Guesses': (get_avg_guesses, True),
+    'Total Guesses': (get_tot_guesses, True),
+    'Completion %': (get_completion_percent, True),
+    'Connections': (get_cons, True),
+    'Subconnections': (get_sub_cons, True),
+    'Mistakes %': (get_average_mistakes, False),
+    'Mistakes': (get_mistakes, False),
+}
+
+# stat name -> PlayerTable.stats() column with the same values, to rebuild every index at once
+METRIC_STATS = {
+    'Win %': 'winPercent',
+    'Wins': 'winCount',
+    'Submissions': 'submissionCount',
+    'Avg. Guesses': 'averageGuesses',
+    'Total Guesses': 'totalGuessCount',
+    'Completion %': 'completionPercent',
+    'Connections': 'connectionCount',
+    'Subconnections': 'subConnectionCount',
+    'Mistakes %': 'averageMistakes',
+    'Mistakes': 'mistakeCount',
+}
+
+
+def entry_key(entry):
+    return entry[:2]
+
+
+# One sorted list per metric, kept up to date as players change so a leaderboard is just a slice.
+# Entries are (sort key, insertion order, player), ties keep the order players were added in.
+class Leaderboard():
+    def __init__(self):
+        self.indexes = {metric: [] for metric in METRICS}
+        self.entries = {}
+        self.order = {}
+        self.counter = count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, *players):
+        for player in players:
+            if player not in self.order:
+                self.order[player] = next(self.counter)
+            old_entries = self.entries.get(player, {})
+            new_entries = {}
+            for metric, (key, descending) in METRICS.items():
+                value = key(player)
+                entry = (-value if descending else value, self.order[player], player)
+                old_entry = old_entries.get(metric)
+                if old_entry is not None and old_entry[:2] == entry[:2]:
+                    new_entries[metric] = old_entry
+                    continue
+                index = self.indexes[metric]
+                if old_entry is not None:
+                    del index[bisect_left(index, old_entry[:2], key=entry_key)]
+                insort(index, entry, key=entry_key)
+                new_entries[metric] = entry
+            self.entries[player] = new_entries
+
+    def rebuild(self, players: list, stats: dict):
+        # replaces every index with the given players, sorted from their vectorized stats
+        for player in players:
+            if player not in self.order:
+                self.order[player] = next(self.counter)
+        self.order = {player: self.order[player] for player in players}
+        order = np.array([self.order[player] for player in players], dtype=np.int64)
+        self.entries = {player: {} for player in players}
+        for metric, (key, descending) in METRICS.items():
+            values = stats[METRIC_STATS[metric]]
+            keys = -values if descending else values
+            index = []
+            for position in np.lexsort((order, keys)):
+                entry = (keys[position].item(), int(order[position]), players[position])
+                index.append(entry)
+                self.entries[players[position]][metric] = entry
+            self.indexes[metric] = index
+
+    def remove(self, player):
+        old_entries = self.entries.pop(player, None)
+        self.order.pop(player, None)
+        if old_entries is None:
+            return
+        for metric, entry in old_entries.items():
+            index = self.indexes[metric]
+            del index[bisect_left(index, entry[:2], key=entry_key)]
+
+    def ranked(self, metric: str, include=None):
+        players = (entry[2] for entry in self.indexes[metric])
+        if include is None:
+            return players
+        return filter(include, players)
+
+    def page(self, metric: str, offset: int, limit: int, include=None) -> list:
+        return list(islice(self.ranked(metric, include), offset, offset + limit))
@@ -0,0 +1,77 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import datetime
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+TEXT_FORMAT = '[Connections] [%(asctime)s] [%(levelname)s] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# One JSON object per line, for log shippers
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage()}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# Merges the arguments in the thread that logs, since they may change before the listener gets to them,
+# but leaves formatting to the listener so tracebacks stay separate from the message
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def file_handler(filename: str) -> logging.Handler:
+    # LOG_ROTATE=size (default) rotates at LOG_MAX_BYTES, anything else is a TimedRotatingFileHandler interval like midnight or h
+    rotate = os.getenv('LOG_ROTATE', 'size')
+    backups = int(os.getenv('LOG_BACKUPS', '5'))
+    if rotate == 'size':
+        return RotatingFileHandler(filename, maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))), backupCount=backups, encoding='utf-8')
+    return TimedRotatingFileHandler(filename, when=rotate, backupCount=backups, encoding='utf-8')
+
+
+# Logs through a queue, so the event loop only enqueues records and a listener thread does the formatting
+# and file and console writes. The listener is stopped (and the queue drained) at exit.
+def setup_logging(name: str = 'Connections Tracker') -> QueueListener:
+    if multiprocessing.parent_process() is not None:
+        # chart renderers are spawned processes that import the bot's main module, only the bot itself writes the logs
+        return None
+    logger = logging.getLogger(name)
+    level = logging.getLevelName(os.getenv('LOG_LEVEL', 'DEBUG').upper())
+    if not isinstance(level, int):
+        raise ValueError(f'Unknown LOG_LEVEL {os.getenv("LOG_LEVEL")}')
+    logger.setLevel(level)
+
+    if os.getenv('LOG_FORMAT', 'text') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+    handlers = [file_handler(os.getenv('LOG_FILE', 'connections.log')), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    logger.addHandler(RecordQueueHandler(records))
+    logger.propagate = False
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
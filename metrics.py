@@ -0,0 +1,182 @@
+import os
+import time
+import bisect
+import asyncio
+import logging
+from contextlib import nullcontext
+
+logger = logging.getLogger("Connections Tracker")
+
+# upper bounds in seconds, from a fast in-memory step up to a slow midnight job
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram():
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one counts values above every bound
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # the upper bound of the bucket holding the q-th value, or the largest value seen past the last bound
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return self.max
+
+
+class Timer():
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+# Counters, latency histograms and gauges in Prometheus' text format. Collection is off unless METRICS=1 or
+# METRICS_PORT is set, and every call returns right away while it is off, so instrumenting hot paths costs next to nothing.
+class Metrics():
+    def __init__(self, enabled: bool = False, prefix: str = 'connections_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.gauges = {}  # name -> callback returning the current value, read on scrape
+        self.help = {}
+        self.server = None
+
+    def describe(self, name: str, help: str):
+        self.help[name] = help
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name: str, value: float, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(value)
+
+    def time(self, name: str, **labels):
+        # with metrics.time('name'): ... records how long the block took
+        if not self.enabled:
+            return nullcontext()
+        return Timer(self.histogram(name, **labels))
+
+    def gauge(self, name: str, callback, help: str = None):
+        self.gauges[name] = callback
+        if help:
+            self.describe(name, help)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self) -> str:
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name in described:
+                return
+            described.add(name)
+            if name in self.help:
+                lines.append(f'# HELP {self.prefix}{name} {self.help[name]}')
+            lines.append(f'# TYPE {self.prefix}{name} {kind}')
+
+        def format_labels(labels, extra: tuple = ()) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, 'counter')
+            lines.append(f'{self.prefix}{name}_total{format_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{self.prefix}{name}_bucket{format_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{self.prefix}{name}_bucket{format_labels(labels, (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'{self.prefix}{name}_sum{format_labels(labels)} {histogram.sum}')
+            lines.append(f'{self.prefix}{name}_count{format_labels(labels)} {histogram.count}')
+        for name, callback in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                logger.info(f'Failed to read gauge {name}: {e}')
+                continue
+            header(name, 'gauge')
+            lines.append(f'{self.prefix}{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9108):
+        # a minimal HTTP endpoint, every GET gets the current metrics
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+                if request.startswith(b'GET '):
+                    body = self.render().encode('utf-8')
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                                 b'Content-Length: ' + str(len(body)).encode() + b'\r\nConnection: close\r\n\r\n' + body)
+                else:
+                    writer.write(b'HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                await writer.drain()
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        self.server = await asyncio.start_server(handle, host, port)
+        logger.info(f'Serving metrics on http://{host}:{port}/metrics')
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+
+metrics = Metrics(enabled=bool(os.getenv('METRICS_PORT')) or os.getenv('METRICS', '0') == '1')
+metrics.describe('submissions', 'Result messages by outcome')
+metrics.describe('message_seconds', 'Time from receiving a message in a bound channel until it was handled')
+metrics.describe('process_seconds', 'Time to apply and persist a submission, feedback included')
+metrics.describe('feedback_seconds', 'Time from receiving a submission until its reactions or reply were sent')
+metrics.describe('discord_request_seconds', 'Duration of Discord REST calls')
+metrics.describe('persist_seconds', 'Duration of a coalesced storage write')
+metrics.describe('persisted_players', 'Player rows written to storage')
+metrics.describe('persist_failures', 'Storage writes that failed and were retried')
+metrics.describe('writes_avoided', 'Changes that joined an already scheduled storage write instead of causing their own')
+metrics.describe('broadcast_messages', 'Parts of scoreboards, pings and reminders sent')
+metrics.describe('broadcast_retries', 'Broadcast parts sent again after a failure')
+metrics.describe('broadcast_deduplicated', 'Broadcast parts that were posted although sending them failed')
+metrics.describe('direct_message_failures', 'Reminders that could not be sent as direct messages')
+metrics.describe('charts', 'Chart requests by whether the chart was cached or rendered')
+metrics.describe('chart_seconds', 'Time to render a chart in the process pool')
+metrics.describe('tally_seconds', 'Duration of tallying a tracker\'s scores')
+metrics.describe('job_seconds', 'Duration of daily jobs')
+metrics.describe('scheduler_lag_seconds', 'How late scheduled jobs started after their deadline')
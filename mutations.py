@@ -0,0 +1,47 @@
+import asyncio
+
+
+# A tracker's single writer. Mutations are plain functions, so each one runs to completion without
+# interleaving with anything else, and they are applied one at a time in the order they were submitted.
+# Callers get the mutation's return value back and do their network I/O (reactions, replies, scoreboards)
+# afterwards, outside the queue, so a slow Discord call never holds up the next submission.
+class MutationQueue():
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.applied = 0
+
+    def submit(self, mutation, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((mutation, args, future))
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return future
+
+    async def run(self):
+        while True:
+            mutation, args, future = await self.queue.get()
+            # everything queued while the writer was waiting is applied in the same pass, without yielding in between
+            while True:
+                if not future.cancelled():
+                    try:
+                        future.set_result(mutation(*args))
+                    except Exception as e:
+                        future.set_exception(e)
+                self.applied += 1
+                self.queue.task_done()
+                if self.queue.empty():
+                    break
+                mutation, args, future = self.queue.get_nowait()
+
+    async def close(self):
+        # applies what is already queued, then stops the writer
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
@@ -0,0 +1,120 @@
+import time
+import asyncio
+import logging
+
+from storage import Storage, player_key, player_to_dict
+from history import HistoryStore
+from metrics import metrics
+
+logger = logging.getLogger("Connections Tracker")
+
+
+# Collects "state dirty" notifications from the event loop and writes them to storage in a worker thread.
+# Notifications that arrive while a write is already pending are folded into it.
+class PersistenceWriter():
+    def __init__(self, storage: Storage, get_state, delay: float = 1.0, history: HistoryStore = None):
+        self.storage = storage
+        self.history = history
+        self.get_state = get_state
+        self.delay = delay
+        self.dirty_state = False
+        self.dirty_history = False
+        self.dirty_players = {}
+        self.deleted_players = set()
+        self.pending = False
+        self.lock = asyncio.Lock()
+        self.writes = 0
+        self.writes_avoided = 0
+
+    def mark_state(self):
+        self.dirty_state = True
+        self._schedule()
+
+    def mark_history(self):
+        self.dirty_history = True
+        self._schedule()
+
+    def mark_players(self, *players):
+        for player in players:
+            key = player_key(player.userId, player.name)
+            self.deleted_players.discard(key)
+            self.dirty_players[key] = player
+        self._schedule()
+
+    def mark_deleted(self, key: str):
+        self.dirty_players.pop(key, None)
+        self.deleted_players.add(key)
+        self._schedule()
+
+    def _schedule(self):
+        if self.pending:
+            self.writes_avoided += 1
+            metrics.inc('writes_avoided')
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # not running on the event loop (e.g. from a script), write immediately
+            self._write(*self._snapshot())
+            return
+        self.pending = True
+        loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    def _snapshot(self):
+        # taken on the event loop so the worker thread never sees a half-updated player
+        state = self.get_state() if self.dirty_state else None
+        players = {key: player_to_dict(player) for key, player in self.dirty_players.items()}
+        deleted = self.deleted_players
+        self.dirty_state = False
+        self.dirty_history = False
+        self.dirty_players = {}
+        self.deleted_players = set()
+        self.pending = False
+        return state, players, deleted
+
+    def _write(self, state, players, deleted):
+        if self.history is not None:
+            # history keeps its own queue of unwritten rows, flushing it when nothing is queued is a no-op
+            self.history.flush()
+        for key in deleted:
+            self.storage.delete_player(key)
+        if players:
+            self.storage.save_players(players)
+        if state is not None:
+            self.storage.save_state(state)
+        self.writes += 1
+
+    async def flush(self):
+        async with self.lock:
+            if not self.dirty_state and not self.dirty_history and not self.dirty_players and not self.deleted_players:
+                self.pending = False
+                return
+            dirty_players = self.dirty_players
+            state, players, deleted = self._snapshot()
+            try:
+                start = time.perf_counter()
+                await asyncio.to_thread(self._write, state, players, deleted)
+                metrics.observe('persist_seconds', time.perf_counter() - start)
+                metrics.inc('persisted_players', len(players))
+                logger.debug('Persisted %d players (%d writes, %d avoided by coalescing)', len(players), self.writes, self.writes_avoided)
+            except Exception as e:
+                logger.exception(f'Failed to persist state, will retry: {e}')
+                metrics.inc('persist_failures')
+                # merge the failed write back in without overriding anything newer
+                for key in deleted:
+                    if key not in self.dirty_players:
+                        self.deleted_players.add(key)
+                for key, player in dirty_players.items():
+                    if key not in self.deleted_players:
+                        self.dirty_players.setdefault(key, player)
+                self.dirty_state = self.dirty_state or state is not None
+                self.dirty_history = self.history is not None
+                self._schedule()
+
+    async def close(self):
+        await self.flush()
+        self.storage.close()
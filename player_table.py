@@ -0,0 +1,136 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger("Connections Tracker")
+
+# column name -> dtype, a row's userId of 0 means the id isn't known yet
+COLUMNS = {
+    'userId': np.uint64,
+    'score': np.int32,
+    'winCount': np.int32,
+    'connectionCount': np.int32,
+    'subConnectionCount': np.int32,
+    'mistakeCount': np.int32,
+    'submissionCount': np.int32,
+    'totalGuessCount': np.int32,
+    'registered': np.bool_,
+    'silenced': np.bool_,
+    'completedToday': np.bool_,
+    'succeededToday': np.bool_,
+    'dmReminders': np.bool_,
+}
+
+
+def counter_property(name: str):
+    def get(self):
+        return int(self.table.columns[name][self.index])
+
+    def set(self, value):
+        self.table.columns[name][self.index] = value
+    return property(get, set)
+
+
+def flag_property(name: str, refresh: bool = False):
+    def get(self):
+        return bool(self.table.columns[name][self.index])
+
+    def set(self, value):
+        self.table.columns[name][self.index] = value
+        # the registry tracks who is registered and who has completed today, so keep it informed
+        if refresh and self.registry:
+            self.registry.refresh(self)
+    return property(get, set)
+
+
+# A row of a PlayerTable. It only holds its position, every attribute reads and writes the table's columns.
+class Player():
+    __slots__ = ('table', 'index', 'registry')
+
+    def __init__(self, table, index: int):
+        self.table = table
+        self.index = index
+        self.registry = None
+
+    @property
+    def name(self):
+        return self.table.names[self.index]
+
+    @name.setter
+    def name(self, value):
+        self.table.names[self.index] = value
+
+    @property
+    def userId(self):
+        return int(self.table.columns['userId'][self.index]) or None
+
+    @userId.setter
+    def userId(self, value):
+        self.table.columns['userId'][self.index] = value or 0
+
+    score = counter_property('score')
+    winCount = counter_property('winCount')
+    connectionCount = counter_property('connectionCount')
+    subConnectionCount = counter_property('subConnectionCount')
+    mistakeCount = counter_property('mistakeCount')
+    submissionCount = counter_property('submissionCount')
+    totalGuessCount = counter_property('totalGuessCount')
+    registered = flag_property('registered', refresh=True)
+    silenced = flag_property('silenced')
+    completedToday = flag_property('completedToday', refresh=True)
+    succeededToday = flag_property('succeededToday')
+    dmReminders = flag_property('dmReminders')
+
+    # mentions are built from the id so no member lookup is needed, players without one get their name
+    @property
+    def mention(self):
+        userId = self.userId
+        if userId is None:
+            logger.info(f'Failed to mention user {self.name}')
+            return self.name
+        return f'<@{userId}>'
+
+
+# Player counters stored column-wise in NumPy arrays, so stats over every player are computed in one pass.
+# Rows are never reused, a removed player's row is only marked dead.
+class PlayerTable():
+    def __init__(self, capacity: int = 64):
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.alive = np.zeros(capacity, dtype=np.bool_)
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str, userId: int = None) -> Player:
+        index = len(self.names)
+        if index == len(self.alive):
+            for column, values in self.columns.items():
+                self.columns[column] = np.concatenate((values, np.zeros_like(values)))
+            self.alive = np.concatenate((self.alive, np.zeros_like(self.alive)))
+        self.names.append(name)
+        for values in self.columns.values():
+            values[index] = 0
+        self.columns['registered'][index] = True
+        self.alive[index] = True
+        player = Player(self, index)
+        player.userId = userId
+        return player
+
+    def remove(self, player: Player):
+        self.alive[player.index] = False
+
+    def stats(self, indices: np.ndarray = None) -> dict:
+        # column name or derived stat -> values for the given rows (every live row by default).
+        # Averages are 0 for players without submissions instead of dividing by zero.
+        if indices is None:
+            indices = np.flatnonzero(self.alive[:len(self.names)])
+        stats = {name: values[indices] for name, values in self.columns.items()}
+        submissions = stats['submissionCount']
+
+        def per_submission(values):
+            return np.divide(values, submissions, out=np.zeros(len(indices)), where=submissions > 0)
+        stats['winPercent'] = per_submission(stats['winCount']) * 100
+        stats['averageGuesses'] = per_submission(stats['totalGuessCount'])
+        stats['averageMistakes'] = per_submission(stats['mistakeCount'])
+        stats['completionPercent'] = per_submission(stats['connectionCount']) * 100
+        return stats
@@ -0,0 +1,21 @@
+from discord import Intents, MemberCacheFlags
+
+PROFILES = ('full', 'lean')
+
+
+# Keyword arguments for the client in each runtime profile.
+# full caches every member and presence of every guild, lean only asks for what the tracker uses:
+# guild and channel info for slash commands, and the content of messages in guild channels.
+def client_options(profile: str = 'full') -> dict:
+    if profile == 'full':
+        return {'intents': Intents.all()}
+    if profile != 'lean':
+        raise ValueError(f'Unknown runtime profile {profile}, expected one of {", ".join(PROFILES)}')
+    intents = Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return {'intents': intents,
+            'member_cache_flags': MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+            'max_messages': None}
@@ -0,0 +1,97 @@
+import time
+import asyncio
+import logging
+
+from discord import Message
+
+from result_parser import ParsedResult
+from metrics import metrics
+
+logger = logging.getLogger("Connections Tracker")
+
+SCORE_EMOJI = ('0️⃣', '1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟')
+FEEDBACK_MODES = ('reactions', 'compact', 'reply')
+
+
+def score_emoji(score: int) -> str:
+    # None for scores without a keycap emoji, policies can score well past 10
+    return SCORE_EMOJI[score] if 0 <= score < len(SCORE_EMOJI) else None
+
+
+def verdict_emoji(result: ParsedResult) -> str:
+    return '👍' if result.succeeded else '👎'
+
+
+def feedback_reactions(result: ParsedResult, score: int, compact: bool = False) -> list:
+    # compact is just the score, or the verdict for scores that have no emoji
+    score_reaction = score_emoji(score)
+    if compact:
+        return [score_reaction or verdict_emoji(result)]
+    reactions = list(result.squares)
+    if score_reaction:
+        reactions.append(score_reaction)
+    reactions.append(verdict_emoji(result))
+    return reactions
+
+
+class TokenBucket():
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()  # FIFO, so tokens are handed out in request order
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Sends submission feedback. Reactions for a message are computed up front and issued concurrently,
+# paced by a token bucket per channel and capped by a global concurrency limit.
+class ReactionDispatcher():
+    def __init__(self, mode: str = 'reactions', rate: float = 4.0, burst: int = 4, concurrency: int = 8):
+        if mode not in FEEDBACK_MODES:
+            raise ValueError(f'Unknown feedback mode {mode}, expected one of {", ".join(FEEDBACK_MODES)}')
+        self.mode = mode
+        self.rate = rate
+        self.burst = burst
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.buckets = {}
+
+    def get_bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.buckets[channel_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def send_feedback(self, message: Message, result: ParsedResult, score: int, received_at: float = None):
+        bucket = self.get_bucket(message.channel.id)
+        if self.mode == 'reply':
+            await bucket.acquire()
+            async with self.semaphore:
+                with metrics.time('discord_request_seconds', call='reply'):
+                    await message.reply(f'{"".join(result.squares)} {score} {"point" if score == 1 else "points"} {verdict_emoji(result)}', mention_author=False)
+        else:
+            reactions = feedback_reactions(result, score, self.mode == 'compact')
+            results = await asyncio.gather(*(self.react(message, bucket, reaction) for reaction in reactions), return_exceptions=True)
+            for reaction, error in zip(reactions, results):
+                if isinstance(error, Exception):
+                    logger.info('Failed to add reaction %s to message %s: %s', reaction, message.id, error)
+        if received_at is not None:
+            elapsed = time.perf_counter() - received_at
+            metrics.observe('feedback_seconds', elapsed)
+            logger.info('Feedback for message %s finished %.1f ms after receipt', message.id, elapsed * 1000)
+
+    async def react(self, message: Message, bucket: TokenBucket, reaction: str):
+        await bucket.acquire()
+        async with self.semaphore:
+            with metrics.time('discord_request_seconds', call='reaction'):
+                await message.add_reaction(reaction)
@@ -0,0 +1,103 @@
+def name_key(name: str) -> str:
+    return name.strip().lower()
+
+
+# Players keyed by Discord user id with a case-insensitive name index.
+# Iterates in registration order and keeps the registered and completed-today subsets up to date
+# as players change, so checking whether everyone has finished doesn't need a scan.
+class PlayerRegistry():
+    def __init__(self):
+        self.players = {}  # dicts are used as insertion-ordered sets
+        self.by_id = {}
+        self.by_name = {}
+        self.registered = {}
+        self.completed = {}
+
+    def __iter__(self):
+        return iter(list(self.players))
+
+    def __len__(self):
+        return len(self.players)
+
+    def __bool__(self):
+        return bool(self.players)
+
+    def __contains__(self, player):
+        return player in self.players
+
+    def add(self, player):
+        # returns the player moved off the name, if any
+        displaced = self.release(player.name, player)
+        self.players[player] = None
+        self.by_name[name_key(player.name)] = player
+        if player.userId is not None:
+            self.by_id[player.userId] = player
+        player.registry = self
+        self.refresh(player)
+        return displaced
+
+    def remove(self, player):
+        self.players.pop(player, None)
+        self.registered.pop(player, None)
+        self.completed.pop(player, None)
+        if self.by_name.get(name_key(player.name)) is player:
+            del self.by_name[name_key(player.name)]
+        if player.userId is not None and self.by_id.get(player.userId) is player:
+            del self.by_id[player.userId]
+        player.registry = None
+
+    def refresh(self, player):
+        if player not in self.players:
+            return
+        if player.registered:
+            self.registered[player] = None
+        else:
+            self.registered.pop(player, None)
+        if player.registered and player.completedToday:
+            self.completed[player] = None
+        else:
+            self.completed.pop(player, None)
+
+    def get_by_id(self, user_id: int):
+        return self.by_id.get(user_id)
+
+    def get_by_name(self, name: str):
+        return self.by_name.get(name_key(name))
+
+    def set_id(self, player, user_id: int):
+        if player.userId is not None and self.by_id.get(player.userId) is player:
+            del self.by_id[player.userId]
+        player.userId = user_id
+        self.by_id[user_id] = player
+
+    def rename(self, player, name: str):
+        # returns the player moved off the name, if any
+        displaced = self.release(name, player)
+        if self.by_name.get(name_key(player.name)) is player:
+            del self.by_name[name_key(player.name)]
+        player.name = name
+        self.by_name[name_key(name)] = player
+        return displaced
+
+    def release(self, name: str, player):
+        # names are unique. Another player still holding one was renamed on Discord since they were last seen,
+        # so they keep it with their id attached until they are seen again.
+        holder = self.by_name.get(name_key(name))
+        if holder is None or holder is player:
+            return None
+        self.rename(holder, f'{holder.name} ({holder.userId if holder.userId is not None else "unknown"})')
+        return holder
+
+    def find(self, user):
+        # look up a Discord user, adopting its id for players only known by name. A name held by a player with another id
+        # belongs to someone else (e.g. a name freed by a rename), so the user isn't registered.
+        player = self.by_id.get(user.id)
+        if player is None:
+            player = self.get_by_name(user.name)
+            if player is None or player.userId is not None:
+                return None
+            self.set_id(player, user.id)
+        return player
+
+    def all_completed(self) -> bool:
+        return len(self.completed) == len(self.registered)
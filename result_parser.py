@@ -0,0 +1,70 @@
+from typing import NamedTuple
+
+YELLOW, GREEN, BLUE, PURPLE = range(4)
+COLOR_SQUARES = ('🟨', '🟩', '🟦', '🟪')
+
+# maps each square to a base 4 digit so a guess row becomes a single 8 bit int with int(row, 4)
+SQUARE_DIGITS = str.maketrans({square: str(color) for color, square in enumerate(COLOR_SQUARES)})
+# a row where all four squares are the same color
+SOLVED_ROWS = {int(str(color) * 4, 4): color for color in range(4)}
+
+
+class ParsedResult(NamedTuple):
+    puzzle_number: int
+    guesses: bytes  # one byte per guess, four 2 bit color codes with the first square in the high bits
+    mistakes: int
+    solved: int  # bitmask with bit (1 << color) set for each solved category
+    solve_order: bytes  # colors in the order they were solved
+
+    @property
+    def succeeded(self) -> bool:
+        return self.solved == 0b1111
+
+    # shared with the other games' results, see games.py
+    @property
+    def guess_count(self) -> int:
+        return len(self.guesses)
+
+    @property
+    def progress(self) -> int:
+        return len(self.solve_order)
+
+    @property
+    def squares(self) -> tuple:
+        return tuple(COLOR_SQUARES[color] for color in self.solve_order)
+
+
+def guess_colors(guess: int) -> tuple:
+    return (guess >> 6, (guess >> 4) & 3, (guess >> 2) & 3, guess & 3)
+
+
+# Returns None for anything that isn't a Connections result and raises ValueError for malformed results
+def parse_result(content: str):
+    # cheap reject for ordinary chat
+    if 'Puzzle #' not in content or 'Connections' not in content:
+        return None
+    puzzle_number = None
+    guesses = bytearray()
+    solve_order = bytearray()
+    solved = 0
+    for line in content.splitlines():
+        line = line.strip()
+        digits = line.translate(SQUARE_DIGITS)
+        if digits == line:
+            # no squares on this line
+            if puzzle_number is None and 'Puzzle #' in line:
+                puzzle_number = int(line.split('#', 1)[1])
+            continue
+        if len(digits) != 4 or not digits.isdigit():
+            raise ValueError(f'Guess row {line!r} does not have four squares')
+        guess = int(digits, 4)  # raises ValueError for digits that weren't squares
+        guesses.append(guess)
+        color = SOLVED_ROWS.get(guess)
+        if color is not None:
+            solve_order.append(color)
+            solved |= 1 << color
+    if not guesses:
+        return None
+    if puzzle_number is None:
+        raise ValueError('Result has no puzzle number')
+    return ParsedResult(puzzle_number, bytes(guesses), len(guesses) - len(solve_order), solved, bytes(solve_order))
@@ -0,0 +1,98 @@
+import time
+import heapq
+import asyncio
+import logging
+import datetime
+from itertools import count
+
+from metrics import metrics
+
+logger = logging.getLogger("Connections Tracker")
+
+# longest single sleep, so a wall clock jump is noticed within this many seconds
+MAX_SLEEP = 60.0
+
+
+def local_now(tz: datetime.tzinfo = None) -> datetime.datetime:
+    return datetime.datetime.now(tz) if tz else datetime.datetime.now().astimezone()
+
+
+def local_datetime(date: datetime.date, at: datetime.time, tz: datetime.tzinfo = None) -> datetime.datetime:
+    # without a timezone, fall back to the host's local time (including its DST rules)
+    if tz is None:
+        return datetime.datetime.combine(date, at).astimezone()
+    return datetime.datetime.combine(date, at, tzinfo=tz)
+
+
+def next_midnight(now: datetime.datetime, tz: datetime.tzinfo = None) -> datetime.datetime:
+    local = now.astimezone(tz) if tz else now.astimezone()
+    return local_datetime(local.date() + datetime.timedelta(days=1), datetime.time(), tz)
+
+
+class Job():
+    def __init__(self, deadline: float, sequence: int, name: str, callback):
+        self.deadline = deadline
+        self.sequence = sequence
+        self.name = name
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.sequence) < (other.deadline, other.sequence)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# Runs callbacks at absolute wall clock deadlines from a min-heap, with one task sleeping until the earliest.
+# Each job runs in its own task so a slow job doesn't delay the others.
+class DeadlineScheduler():
+    def __init__(self):
+        self.heap = []
+        self.sequence = count()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.running = set()
+
+    def __len__(self):
+        return sum(1 for job in self.heap if not job.cancelled)
+
+    def schedule(self, deadline: datetime.datetime, name: str, callback) -> Job:
+        job = Job(deadline.timestamp(), next(self.sequence), name, callback)
+        heapq.heappush(self.heap, job)
+        if self.heap[0] is job:
+            self.wakeup.set()
+        logger.info(f'Scheduled {name} for {deadline.isoformat()}')
+        return job
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            while self.heap and self.heap[0].cancelled:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0].deadline - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), min(delay, MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job = heapq.heappop(self.heap)
+            logger.info(f'Running {job.name} {-delay:.3f} s after its deadline')
+            metrics.observe('scheduler_lag_seconds', -delay)
+            task = asyncio.get_running_loop().create_task(self.run_job(job))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run_job(self, job: Job):
+        try:
+            await job.callback()
+        except Exception as e:
+            logger.exception(f'Error while running {job.name}: {e}')
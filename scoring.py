@@ -0,0 +1,125 @@
+import os
+import json
+import logging
+from typing import NamedTuple
+import numpy as np
+
+from analytics import HistoryAnalytics
+
+logger = logging.getLogger("Connections Tracker")
+
+# 'top': the highest score of the day wins if it is above 0, ties share the win.
+# 'top_completed': the same, but only players who solved all four groups can win.
+WIN_RULES = ('top', 'top_completed')
+
+
+class ScoringPolicy(NamedTuple):
+    version: int
+    color_points: tuple  # points for solving yellow, green, blue and purple
+    win_rule: str = 'top'
+
+    def score(self, solve_order: bytes) -> int:
+        return sum(self.color_points[color] for color in solve_order)
+
+    def can_win(self, succeeded: bool) -> bool:
+        return succeeded or self.win_rule == 'top'
+
+    def describe(self) -> str:
+        rule = 'highest score wins' if self.win_rule == 'top' else 'highest score among completed puzzles wins'
+        return f'v{self.version}: yellow {self.color_points[0]}, green {self.color_points[1]}, blue {self.color_points[2]}, purple {self.color_points[3]}, {rule}'
+
+
+# version 1 is the original difficulty tweak, yellow is the easiest
+DEFAULT_POLICY = ScoringPolicy(1, (1, 2, 3, 4), 'top')
+
+
+# Versions from SCORING_FILE (default scoring.json), a JSON list like [{"version": 2, "color_points": [1, 1, 2, 3], "win_rule": "top"}].
+# Versions are never reused, a tracker's state only records the version it scores with.
+def load_policies(filename: str = None) -> dict:
+    filename = filename or os.getenv('SCORING_FILE', 'scoring.json')
+    policies = {DEFAULT_POLICY.version: DEFAULT_POLICY}
+    if not os.path.exists(filename):
+        return policies
+    with open(filename, 'r', encoding='utf-8') as file:
+        for entry in json.load(file):
+            policy = ScoringPolicy(int(entry['version']), tuple(int(points) for points in entry['color_points']), entry.get('win_rule', 'top'))
+            if len(policy.color_points) != 4 or not all(0 <= points <= 63 for points in policy.color_points):
+                raise ValueError(f'Scoring policy {policy.version} needs four color points between 0 and 63')
+            if policy.win_rule not in WIN_RULES:
+                raise ValueError(f'Unknown win rule {policy.win_rule}, expected one of {", ".join(WIN_RULES)}')
+            if policies.get(policy.version, policy) != policy:
+                raise ValueError(f'Scoring policy {policy.version} is already defined differently')
+            policies[policy.version] = policy
+    logger.info(f'Loaded {len(policies)} scoring policies from {filename}')
+    return policies
+
+
+POLICIES = load_policies()
+
+
+def daily_wins(puzzle_index: np.ndarray, scores: np.ndarray, eligible: np.ndarray, puzzle_count: int) -> np.ndarray:
+    # whether each submission won its day: the top eligible score of the puzzle, above 0
+    top = np.zeros(puzzle_count, dtype=np.int64)
+    np.maximum.at(top, puzzle_index[eligible], scores[eligible])
+    return eligible & (scores == top[puzzle_index]) & (scores > 0)
+
+
+def daily_places(puzzles: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    # place of each submission on its day's scoreboard, equal scores share a place like in tally_scores
+    order = np.lexsort((-scores, puzzles))
+    sorted_puzzles = puzzles[order]
+    sorted_scores = scores[order]
+    new_day = np.ones(len(order), dtype=bool)
+    new_day[1:] = sorted_puzzles[1:] != sorted_puzzles[:-1]
+    new_place = new_day.copy()
+    new_place[1:] |= sorted_scores[1:] != sorted_scores[:-1]
+    counter = np.cumsum(new_place)
+    day_start = np.maximum.accumulate(np.where(new_day, counter, 0))
+    places = np.empty(len(order), dtype=np.int64)
+    places[order] = counter - day_start + 1
+    return places
+
+
+def policy_wins(data: HistoryAnalytics, scores: np.ndarray, policy: ScoringPolicy, puzzle_number: int, scored_today: bool) -> np.ndarray:
+    # whether each submission won its day under the policy, like tally_scores. Today's puzzle only counts once it was scored.
+    tallied = data.puzzles <= (puzzle_number if scored_today else puzzle_number - 1)
+    eligible = tallied & (data.completed | (policy.win_rule == 'top'))
+    return daily_wins(data.puzzle_index, scores, eligible, len(data.puzzle_ids))
+
+
+class Rescore(NamedTuple):
+    old_policy: ScoringPolicy
+    policy: ScoringPolicy
+    rows: int  # history rows the rescore was computed from
+    scores: np.ndarray  # new score of every history row, in storage order
+    user_ids: np.ndarray
+    old_wins: np.ndarray  # wins per user from the history as it was scored, for puzzles already tallied
+    new_wins: np.ndarray  # the same under the new policy
+    today_scores: dict  # user id -> new score on the current puzzle
+    changed_places: int  # daily scoreboard places that move
+    changed_days: int  # days whose winners change
+
+
+# Recomputes every submission's score, daily place and win under another policy in one pass over the history.
+# Today's puzzle only counts for wins once it was scored.
+# Build the HistoryAnalytics on the event loop (it copies the columns) and call this in a worker thread.
+def rescore(data: HistoryAnalytics, old_policy: ScoringPolicy, policy: ScoringPolicy, puzzle_number: int, scored_today: bool) -> Rescore:
+    solved_colors = (data.solved[:, None] >> np.arange(4)) & 1
+    scores = solved_colors @ np.array(policy.color_points, dtype=np.int64)
+    old_won = policy_wins(data, data.scores, old_policy, puzzle_number, scored_today)
+    new_won = policy_wins(data, scores, policy, puzzle_number, scored_today)
+    user_count = len(data.user_ids)
+    today = data.puzzles == puzzle_number
+    return Rescore(old_policy, policy, len(data), scores, data.user_ids,
+                   np.bincount(data.user_index, weights=old_won, minlength=user_count).astype(np.int64),
+                   np.bincount(data.user_index, weights=new_won, minlength=user_count).astype(np.int64),
+                   dict(zip(data.user_ids[data.user_index[today]].tolist(), scores[today].tolist())),
+                   int((daily_places(data.puzzles, data.scores) != daily_places(data.puzzles, scores)).sum()),
+                   len(np.unique(data.puzzle_index[old_won != new_won])))
+
+
+def win_places(wins: np.ndarray) -> np.ndarray:
+    # place on the wins leaderboard, ties keep registration order like Leaderboard
+    places = np.empty(len(wins), dtype=np.int64)
+    places[np.lexsort((np.arange(len(wins)), -wins))] = np.arange(1, len(wins) + 1)
+    return places
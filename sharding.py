@@ -0,0 +1,54 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("Connections Tracker")
+
+
+def shard_for(guild_id: int, shard_count: int) -> int:
+    # the shard Discord sends a guild's events to
+    return (guild_id >> 22) % shard_count
+
+
+# Keyword arguments for the client from SHARDS and SHARD_IDS.
+# SHARDS=auto uses Discord's recommended shard count, a number fixes it, and SHARD_IDS limits this process to some of them.
+def shard_options() -> dict:
+    shards = os.getenv('SHARDS')
+    if not shards:
+        return {}
+    options = {'shard_count': None if shards == 'auto' else int(shards)}
+    if os.getenv('SHARD_IDS'):
+        if options['shard_count'] is None:
+            raise ValueError('SHARD_IDS needs a fixed SHARDS count')
+        options['shard_ids'] = [int(shard_id) for shard_id in os.getenv('SHARD_IDS').split(',')]
+    return options
+
+
+# Daily jobs claimed per tracker and local day in a database shared by every process,
+# so a job runs once even if two processes think they own a tracker (e.g. during a rolling restart).
+class JobLedger():
+    def __init__(self, filename: str = 'jobs.db', owner: str = None):
+        self.owner = owner or f'pid {os.getpid()}'
+        self.connection = sqlite3.connect(filename, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()  # claims come from worker threads and share the connection
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS claims (tracker INTEGER NOT NULL, job TEXT NOT NULL, day TEXT NOT NULL, '
+                                    'owner TEXT NOT NULL, claimed_at REAL NOT NULL, PRIMARY KEY (tracker, job, day))')
+
+    def claim(self, tracker: int, job: str, day: str) -> bool:
+        with self.lock, self.connection:
+            cursor = self.connection.execute('INSERT OR IGNORE INTO claims (tracker, job, day, owner, claimed_at) VALUES (?, ?, ?, ?, ?)',
+                                             (tracker, job, day, self.owner, time.time()))
+            return cursor.rowcount == 1
+
+    def prune(self, max_age: float = 7 * 86400):
+        with self.lock, self.connection:
+            cursor = self.connection.execute('DELETE FROM claims WHERE claimed_at < ?', (time.time() - max_age,))
+        if cursor.rowcount:
+            logger.info(f'Pruned {cursor.rowcount} old job claims')
+
+    def close(self):
+        self.connection.close()
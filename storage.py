@@ -0,0 +1,236 @@
+import os
+import json
+import sqlite3
+import logging
+
+logger = logging.getLogger("Connections Tracker")
+
+# Player attributes that are persisted, in column order, with their SQLite types
+PLAYER_FIELDS = {
+    'userId': 'INTEGER',
+    'winCount': 'INTEGER NOT NULL DEFAULT 0',
+    'connectionCount': 'INTEGER NOT NULL DEFAULT 0',
+    'subConnectionCount': 'INTEGER NOT NULL DEFAULT 0',
+    'submissionCount': 'INTEGER NOT NULL DEFAULT 0',
+    'mistakeCount': 'INTEGER NOT NULL DEFAULT 0',
+    'totalGuessCount': 'INTEGER NOT NULL DEFAULT 0',
+    'score': 'INTEGER NOT NULL DEFAULT 0',
+    'registered': 'INTEGER NOT NULL DEFAULT 1',
+    'silenced': 'INTEGER NOT NULL DEFAULT 0',
+    'completedToday': 'INTEGER NOT NULL DEFAULT 0',
+    'succeededToday': 'INTEGER NOT NULL DEFAULT 0',
+    'dmReminders': 'INTEGER NOT NULL DEFAULT 0',
+}
+BOOL_FIELDS = {'registered', 'silenced', 'completedToday', 'succeededToday', 'dmReminders'}
+
+
+def column_default(field: str):
+    # what a player saved without the field gets, from its column's DEFAULT clause
+    definition = PLAYER_FIELDS[field]
+    if ' DEFAULT ' not in definition:
+        return None
+    value = int(definition.rsplit(' DEFAULT ', 1)[1])
+    return bool(value) if field in BOOL_FIELDS else value
+
+
+PLAYER_DEFAULTS = {field: column_default(field) for field in PLAYER_FIELDS}
+STATE_FIELDS = ('text_channel', 'puzzle_number', 'last_scored', 'scored_today', 'timezone', 'warning_offset', 'guild_id', 'scoring_version')
+# fields older versions saved with the state, skipped so they aren't read as players
+RETIRED_STATE_FIELDS = ('command_hash',)
+
+
+def player_key(user_id: int, name: str) -> str:
+    # players are stored by user id, since a name can be handed to someone else after a rename.
+    # Players saved before user ids were recorded are stored by name until their id is known.
+    return str(user_id) if user_id is not None else f'name:{name}'
+
+
+def player_to_dict(player) -> dict:
+    fields = {field: getattr(player, field) for field in PLAYER_FIELDS}
+    fields['name'] = player.name
+    return fields
+
+
+# State is a dict keyed by STATE_FIELDS, players map a player_key to a dict keyed by PLAYER_FIELDS plus the player's name
+class Storage():
+    def load(self) -> tuple[dict, dict]:
+        raise NotImplementedError
+
+    def load_state(self) -> dict:
+        return self.load()[0]
+
+    def save_state(self, state: dict):
+        raise NotImplementedError
+
+    def save_players(self, players: dict):
+        raise NotImplementedError
+
+    def delete_player(self, key: str):
+        raise NotImplementedError
+
+    def size(self) -> int:
+        # bytes on disk
+        return 0
+
+    def close(self):
+        pass
+
+
+# The original info.json layout, every save rewrites the whole file
+class JsonStorage(Storage):
+    def __init__(self, filename: str = 'info.json'):
+        self.filename = filename
+        self.state = {}
+        self.players = {}
+
+    def load(self):
+        self.state = {}
+        self.players = {}
+        if not os.path.exists(self.filename):
+            return self.state, self.players
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        for firstField, secondField in data.items():
+            if firstField in STATE_FIELDS:
+                self.state[firstField] = secondField[firstField]
+            elif firstField in RETIRED_STATE_FIELDS:
+                continue
+            else:
+                # files from older versions are keyed by name and lack the fields added since
+                fields = {field: secondField.get(field, PLAYER_DEFAULTS[field]) for field in PLAYER_FIELDS}
+                fields['name'] = secondField.get('name', firstField)
+                self.players.setdefault(player_key(fields['userId'], fields['name']), fields)
+        return dict(self.state), {name: dict(fields) for name, fields in self.players.items()}
+
+    def save_state(self, state: dict):
+        self.state.update(state)
+        self._write()
+
+    def save_players(self, players: dict):
+        for key, fields in players.items():
+            self.players[key] = dict(fields)
+        self._write()
+
+    def delete_player(self, key: str):
+        self.players.pop(key, None)
+        self._write()
+
+    def _write(self):
+        data = {}
+        for field in STATE_FIELDS:
+            if field in self.state:
+                data[field] = {field: self.state[field]}
+        for key, fields in self.players.items():
+            data[key] = fields
+        logger.info(f'Writing {self.filename}')
+        # write to a temporary file first so a crash mid-write never leaves a truncated file behind
+        temp_filename = f'{self.filename}.tmp'
+        with open(temp_filename, 'w+', encoding='utf-8') as file:
+            file.write(json.dumps(data, indent=4))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.filename)
+
+    def size(self):
+        return os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+
+
+# SQLite in WAL mode, saving a player only touches that player's row
+class SqliteStorage(Storage):
+    def __init__(self, filename: str = 'connections.db'):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        columns = ', '.join(f'{field} {definition}' for field, definition in PLAYER_FIELDS.items())
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            existing = {row[1] for row in self.connection.execute('PRAGMA table_info(players)')}
+            if existing and 'player_key' not in existing:
+                # players used to be keyed by name, copy them over to rows keyed by player_key
+                self.connection.execute('ALTER TABLE players RENAME TO players_by_name')
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS players (player_key TEXT PRIMARY KEY, name TEXT NOT NULL, {columns})')
+            # add columns introduced after the database was created
+            current = {row[1] for row in self.connection.execute('PRAGMA table_info(players)')}
+            for field, definition in PLAYER_FIELDS.items():
+                if field not in current:
+                    self.connection.execute(f'ALTER TABLE players ADD COLUMN {field} {definition}')
+            legacy = {row[1] for row in self.connection.execute('PRAGMA table_info(players_by_name)')}
+            if legacy:
+                # also finishes a copy that was interrupted
+                fields = ', '.join(field for field in PLAYER_FIELDS if field in legacy)
+                key = "COALESCE(CAST(userId AS TEXT), 'name:' || name)" if 'userId' in legacy else "'name:' || name"
+                # a user id saved under two names keeps the later row
+                self.connection.execute(f'INSERT OR REPLACE INTO players (player_key, name, {fields}) '
+                                        f'SELECT {key}, name, {fields} FROM players_by_name ORDER BY rowid')
+                self.connection.execute('DROP TABLE players_by_name')
+                logger.info(f'Moved the players in {self.filename} to rows keyed by user id')
+
+    def load(self):
+        state = {key: json.loads(value) for key, value in self.connection.execute('SELECT key, value FROM state')}
+        players = {}
+        fields = list(PLAYER_FIELDS)
+        for row in self.connection.execute(f'SELECT player_key, name, {", ".join(fields)} FROM players ORDER BY rowid'):
+            players[row[0]] = {field: bool(value) if field in BOOL_FIELDS else value for field, value in zip(fields, row[2:])}
+            players[row[0]]['name'] = row[1]
+        return state, players
+
+    def load_state(self):
+        return {key: json.loads(value) for key, value in self.connection.execute('SELECT key, value FROM state')}
+
+    def save_state(self, state: dict):
+        with self.connection:
+            self.connection.executemany('INSERT INTO state (key, value) VALUES (?, ?) '
+                                        'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                                        [(key, json.dumps(value)) for key, value in state.items()])
+
+    def save_players(self, players: dict):
+        if not players:
+            return
+        fields = list(PLAYER_FIELDS)
+        placeholders = ', '.join('?' * (len(fields) + 2))
+        updates = ', '.join(f'{field} = excluded.{field}' for field in ['name'] + fields)
+        rows = [(key, values['name'], *(values.get(field, PLAYER_DEFAULTS[field]) for field in fields)) for key, values in players.items()]
+        with self.connection:
+            self.connection.executemany(f'INSERT INTO players (player_key, name, {", ".join(fields)}) VALUES ({placeholders}) '
+                                        f'ON CONFLICT(player_key) DO UPDATE SET {updates}', rows)
+
+    def delete_player(self, key: str):
+        with self.connection:
+            self.connection.execute('DELETE FROM players WHERE player_key = ?', (key,))
+
+    def size(self):
+        return sum(os.path.getsize(filename) for filename in (self.filename, f'{self.filename}-wal') if os.path.exists(filename))
+
+    def close(self):
+        self.connection.close()
+
+
+def migrate_json_to_sqlite(json_filename: str = 'info.json', db_filename: str = 'connections.db') -> SqliteStorage:
+    state, players = JsonStorage(json_filename).load()
+    storage = SqliteStorage(db_filename)
+    storage.save_state(state)
+    storage.save_players(players)
+    logger.info(f'Migrated {len(players)} players from {json_filename} to {db_filename}')
+    return storage
+
+
+def open_storage(backend: str = None, directory: str = '') -> Storage:
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'sqlite')).lower()
+    json_filename = os.path.join(directory, os.getenv('JSON_FILENAME', 'info.json'))
+    if backend == 'json':
+        return JsonStorage(json_filename)
+    if backend != 'sqlite':
+        raise ValueError(f'Unknown storage backend {backend}')
+    db_filename = os.path.join(directory, os.getenv('DB_FILENAME', 'connections.db'))
+    if not os.path.exists(db_filename) and os.path.exists(json_filename):
+        logger.info(f'No database found, migrating existing {json_filename}')
+        return migrate_json_to_sqlite(json_filename, db_filename)
+    return SqliteStorage(db_filename)
+
+
+if __name__ == '__main__':
+    migrate_json_to_sqlite().close()
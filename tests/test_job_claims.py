@@ -0,0 +1,40 @@
+import os
+import asyncio
+import multiprocessing
+
+from shard_harness import FakeChannel, make_trackers, run_worker
+
+
+def run_other_process(directory: str) -> dict:
+    # a second bot process sharing the tracker directory runs every job it can claim
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=run_worker, args=(directory, [0], 1, True, results))
+    worker.start()
+    report = results.get(timeout=60)
+    worker.join()
+    return report
+
+
+async def lose_midnight_claim(directory: str, key: int) -> tuple:
+    import ConnectionsTracker as ct
+
+    client = ct.client
+    client.tracker_dir = os.path.join(directory, 'trackers')
+    client.get_channel = lambda channel_id: FakeChannel(channel_id, [])
+    await client.load_trackers()
+    stale = await client.get_tracker(key)
+    before = stale.puzzle_number
+    report = await asyncio.to_thread(run_other_process, directory)
+    await ct.midnight_job(key)
+    tracker = await client.get_tracker(key)
+    outcome = (before, report['rollovers'], tracker is stale, tracker.puzzle_number, tracker.scored_today)
+    await client.trackers.pop(key).close()
+    client.ledger.close()
+    return outcome
+
+
+def test_process_losing_the_midnight_claim_reloads_the_tracker(tmp_path):
+    key = make_trackers(str(tmp_path), 1, 4, 0)[0]
+    # the other process rolled over to puzzle 101, this one drops its copy of puzzle 100 instead of keeping it
+    assert asyncio.run(lose_midnight_claim(str(tmp_path), key)) == (100, 1, False, 101, False)
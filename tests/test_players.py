@@ -0,0 +1,49 @@
+import types
+import asyncio
+
+from tracker import Tracker
+from load_test import FakeUser
+
+
+async def open_tracker(directory) -> Tracker:
+    tracker = Tracker(types.SimpleNamespace(channels={}), 1, str(directory))
+    await tracker.load()
+    return tracker
+
+
+async def rename_and_reload(directory):
+    tracker = await open_tracker(directory)
+    for user in (FakeUser(1, 'carol'), FakeUser(2, 'dave')):
+        tracker.add_player(tracker.new_player(user.name, user.id))
+        tracker.save_players(tracker.players.get_by_id(user.id))
+    # carol takes the name dave before dave is seen again, then dave shows up as erin
+    tracker.find_player(FakeUser(1, 'dave'))
+    tracker.find_player(FakeUser(2, 'erin'))
+    await tracker.close()
+    tracker = await open_tracker(directory)
+    names = {player.userId: player.name for player in tracker.players}
+    await tracker.close()
+    return names
+
+
+def test_renames_keep_every_player(tmp_path):
+    assert asyncio.run(rename_and_reload(tmp_path)) == {1: 'dave', 2: 'erin'}
+
+
+async def adopt_and_reload(directory):
+    tracker = await open_tracker(directory)
+    player = tracker.new_player('frank')
+    tracker.add_player(player)
+    tracker.save_players(player)
+    await tracker.close()
+    tracker = await open_tracker(directory)
+    tracker.find_player(FakeUser(3, 'Frank'))
+    await tracker.close()
+    tracker = await open_tracker(directory)
+    players = [(player.userId, player.name) for player in tracker.players]
+    await tracker.close()
+    return players
+
+
+def test_player_known_by_name_moves_to_its_id(tmp_path):
+    assert asyncio.run(adopt_and_reload(tmp_path)) == [(3, 'Frank')]
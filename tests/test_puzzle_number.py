@@ -0,0 +1,42 @@
+import random
+import asyncio
+
+from bench_parser import make_result
+from load_test import FakeChannel, FakeMessage, FakeRest, FakeUser
+
+GUILD_ID = 1 << 22
+WORDLE = 'Wordle 1,234 3/6\n\n⬛🟨⬛⬛⬛\n⬛⬛🟩🟨⬛\n🟩🟩🟩🟩🟩'
+
+
+async def bind_and_submit(directory, game: str, content: str, rollovers: int = 0):
+    import ConnectionsTracker as ct
+
+    client = ct.client
+    client.tracker_dir = str(directory)
+    channel = FakeChannel(GUILD_ID + 1, GUILD_ID, FakeRest(0))
+    client.get_channel = lambda channel_id: channel if channel_id == channel.id else None
+    await client.load_trackers()
+    tracker = await client.get_tracker(ct.tracker_key(GUILD_ID, channel.id, game))
+    tracker.text_channel = channel
+    users = [FakeUser(GUILD_ID + 2 + number, f'player{number}') for number in range(2)]
+    for user in users:
+        tracker.add_player(tracker.new_player(user.name, user.id))
+    for _ in range(rollovers):
+        await tracker.mutations.submit(tracker.rollover)
+    await ct.on_message(FakeMessage(1, channel, users[0], content))
+    player = tracker.players.get_by_id(users[0].id)
+    outcome = (tracker.puzzle_number, player.completedToday, channel.sent)
+    del client.trackers[tracker.key]
+    await tracker.close()
+    return outcome
+
+
+def test_fresh_wordle_tracker_accepts_a_submission(tmp_path):
+    # the tracker starts without a puzzle number and takes the submitted one, with no rejection sent
+    assert asyncio.run(bind_and_submit(tmp_path, 'wordle', WORDLE)) == (1234, True, 0)
+
+
+def test_new_connections_tracker_keeps_waiting_for_its_first_result(tmp_path):
+    # midnights before anyone submits don't make up a puzzle number
+    content = make_result(random.Random(0), 500)
+    assert asyncio.run(bind_and_submit(tmp_path, 'connections', content, rollovers=2)) == (500, True, 0)
@@ -0,0 +1,520 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import datetime
+import numpy as np
+from zoneinfo import ZoneInfo
+from typing import NamedTuple
+from discord import Color, Message, TextChannel, User, utils
+
+from storage import open_storage, player_key
+from metrics import metrics
+from persistence import PersistenceWriter
+from mutations import MutationQueue
+from broadcast import chunk_mentions, chunk_embeds
+from charts import ChartCache, scoreboard_data
+from scoring import POLICIES, DEFAULT_POLICY, Rescore, win_places
+from games import GAMES, CONNECTIONS
+from registry import PlayerRegistry, name_key
+from result_parser import ParsedResult
+from history import HistoryStore
+from leaderboard import Leaderboard
+from player_table import Player, PlayerTable
+
+logger = logging.getLogger("Connections Tracker")
+
+# 'guild' keeps one tracker per server, 'channel' one per channel so a server can run several
+TRACKER_SCOPE = os.getenv('TRACKER_SCOPE', 'guild')
+
+
+# Connections trackers are keyed by the server or channel id alone, like before there were other games,
+# other games' trackers by the id and the game's name, e.g. '1234-wordle'
+def tracker_key(guild_id: int, channel_id: int, game: str = CONNECTIONS.name):
+    key = channel_id if TRACKER_SCOPE == 'channel' else guild_id
+    return key if game == CONNECTIONS.name else f'{key}-{game}'
+
+
+def split_key(key) -> tuple:
+    # (server or channel id, game) of a tracker key, raises KeyError for an unknown game
+    if isinstance(key, int):
+        return key, CONNECTIONS
+    community, game = key.split('-', 1)
+    return int(community), GAMES[game]
+
+
+# The messages ending a day, built when it was scored so they show that day's puzzle number.
+# Both are split to fit Discord's message limits on large rosters.
+class DayEnd(NamedTuple):
+    shame: list  # messages, empty when nobody is shamed
+    scoreboard: list  # embeds
+    puzzle_number: int
+    chart: dict  # data of the scoreboard chart, see charts.py
+
+
+# Who to remind of the day's puzzle, by mention in the channel or by direct message for those who opted in
+class Reminder(NamedTuple):
+    mentions: list
+    direct: list  # user ids
+
+
+class Submission(NamedTuple):
+    outcome: str  # accepted, rejected, duplicate, unregistered or closed
+    player: Player
+    score: int
+    reply: str  # sent to the channel instead of feedback, if set
+    day: DayEnd  # set when this was the last submission of the day
+
+
+# One community's roster, scoring state and schedule for one game. Each tracker has its own directory
+# holding its storage, history and backfill checkpoints, so it can be loaded and evicted on its own.
+class Tracker():
+    def __init__(self, client, key, directory: str):
+        self.client = client
+        self.key = key
+        self.game = split_key(key)[1]
+        self.directory = directory
+        self.guild_id = None
+        self.text_channel_id = None
+        self.puzzle_number = 0
+        self.last_scored = datetime.datetime.now().astimezone() - datetime.timedelta(days=1)
+        self.scored_today = False
+        self.sent_warning = False
+        self.timezone = None  # IANA name, None uses the host's local time
+        self.warning_offset = 60  # minutes before midnight
+        self.scoring_version = DEFAULT_POLICY.version  # see scoring.py
+        self.table = PlayerTable()
+        self.players = PlayerRegistry()
+        self.leaderboard = Leaderboard()
+        self.storage = None
+        self.history = HistoryStore(os.path.join(directory, os.getenv('HISTORY_DIR', 'history')))
+        self.persistence = None
+        self.mutations = MutationQueue()  # every change to the day's state goes through here, see submit, end_day and start_day
+        self.charts = ChartCache(os.path.join(directory, 'charts'))  # invalidated by the mutations that change what charts show
+        self.last_active = time.monotonic()
+
+    # e.g. "Wordle #1234", without the number until a new tracker has seen its first result
+    @property
+    def puzzle_title(self) -> str:
+        return f'{self.game.title} #{self.puzzle_number}' if self.puzzle_number else self.game.title
+
+    # only the id is kept so state can be loaded before the channel cache is available
+    @property
+    def text_channel(self) -> TextChannel:
+        return self.client.get_channel(self.text_channel_id) if self.text_channel_id else None
+
+    @text_channel.setter
+    def text_channel(self, channel: TextChannel):
+        bound = self.client.channels.get(self.text_channel_id, {})
+        if bound.get(self.game.name) == self.key:
+            del bound[self.game.name]
+            if not bound:
+                del self.client.channels[self.text_channel_id]
+        self.text_channel_id = channel.id
+        self.guild_id = channel.guild.id
+        self.client.channels.setdefault(channel.id, {})[self.game.name] = self.key
+
+    @property
+    def policy(self):
+        return POLICIES[self.scoring_version]
+
+    @property
+    def tzinfo(self):
+        return ZoneInfo(self.timezone) if self.timezone else None
+
+    async def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.storage = await asyncio.to_thread(open_storage, None, self.directory)
+        self.persistence = PersistenceWriter(self.storage, self.get_state, float(os.getenv('PERSIST_DELAY', '1.0')), self.history)
+        state, players = await asyncio.to_thread(self.storage.load)
+        self.load_state(state, players)
+        await asyncio.to_thread(self.history.load)
+
+    async def close(self):
+        # apply queued changes, flush pending writes and release the storage
+        await self.mutations.close()
+        if self.persistence:
+            await self.persistence.close()
+
+    def find_player(self, user: User):
+        adopting = self.players.get_by_id(user.id) is None
+        player = self.players.find(user)
+        if player and adopting:
+            # players known only by name are stored by name, they move to a record keyed by the id they just got
+            self.persistence.mark_deleted(player_key(None, player.name))
+            self.save_players(player)
+        if player and player.name != user.name.strip():
+            logger.info(f'Player {player.name} is now known as {user.name.strip()}')
+            self.rename_player(player, user.name.strip())
+        return player
+
+    def add_player(self, player: Player):
+        self.save_displaced(player.name, player, self.players.add)
+
+    def rename_player(self, player: Player, name: str):
+        self.save_displaced(name, player, lambda player: self.players.rename(player, name))
+        self.save_players(player)
+
+    def save_displaced(self, name: str, player: Player, change):
+        # whoever held the name is renamed by the registry, a player without an id is stored by name so moves record
+        holder = self.players.get_by_name(name)
+        stale = player_key(None, holder.name) if holder is not None and holder is not player and holder.userId is None else None
+        displaced = change(player)
+        if displaced is not None:
+            logger.info(f'{name} is now used by another player, the player who held it is shown as {displaced.name}')
+            if stale is not None:
+                self.persistence.mark_deleted(stale)
+            # only the name changed, so the leaderboard order holds
+            self.persistence.mark_players(displaced)
+
+    async def resolve_player_ids(self):
+        # one-time migration for players saved before user ids were recorded
+        unresolved = [player for player in self.players if player.userId is None]
+        if not unresolved or not self.text_channel:
+            return
+        guild = self.text_channel.guild
+        members = {}
+        for member in guild.members:
+            members.setdefault(name_key(member.name), member)
+        resolved = []
+        for player in unresolved:
+            member = members.get(name_key(player.name))
+            if not member and not self.client.intents.members:
+                # the lean profile has no member cache, ask the gateway instead
+                matches = await guild.query_members(query=player.name, limit=5, cache=False)
+                member = utils.find(lambda match: name_key(match.name) == name_key(player.name), matches)
+            if member:
+                self.persistence.mark_deleted(player_key(None, player.name))
+                self.players.set_id(player, member.id)
+                resolved.append(player)
+            else:
+                logger.info(f'Could not find a user id for {player.name}')
+        if resolved:
+            self.save_players(*resolved)
+        logger.info(f'Resolved user ids for {len(resolved)} of {len(unresolved)} players in tracker {self.key}')
+
+    def load_state(self, state: dict, players: dict):
+        logger.info(f'Loading tracker {self.key} from {type(self.storage).__name__}')
+        if 'text_channel' in state:
+            self.text_channel_id = int(state['text_channel'])
+            self.client.channels.setdefault(self.text_channel_id, {})[self.game.name] = self.key
+            logger.info(f'Got text channel id of {self.text_channel_id}')
+        if 'guild_id' in state:
+            self.guild_id = state['guild_id']
+        if 'puzzle_number' in state:
+            self.puzzle_number = state['puzzle_number']
+            logger.info(f'Got day number of {self.puzzle_number}')
+        if 'last_scored' in state:
+            self.last_scored = datetime.datetime.fromisoformat(state['last_scored'])
+            logger.info(f'Got last scored datetime of {self.last_scored.isoformat()}')
+        if 'scored_today' in state:
+            self.scored_today = state['scored_today']
+            logger.info(f'Got scored today value of {self.scored_today}')
+        if state.get('timezone'):
+            self.timezone = state['timezone']
+            logger.info(f'Got timezone of {self.timezone}')
+        if 'warning_offset' in state:
+            self.warning_offset = state['warning_offset']
+            logger.info(f'Got warning offset of {self.warning_offset} minutes')
+        if 'scoring_version' in state:
+            if state['scoring_version'] not in POLICIES:
+                raise ValueError(f'Tracker {self.key} scores with policy {state["scoring_version"]}, which is not defined in the scoring file')
+            self.scoring_version = state['scoring_version']
+            logger.info(f'Got scoring policy {self.policy.describe()}')
+        for fields in players.values():
+            if fields['userId'] is None or not self.players.get_by_id(fields['userId']):
+                load_player = self.new_player(fields['name'])
+                for field, value in fields.items():
+                    setattr(load_player, field, value)
+                self.add_player(load_player)
+                # twelve fields per player, so only read them when DEBUG is on
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('Loaded player %s\n'
+                                 '\t\t\twins: %s\n'
+                                 '\t\t\tconnections: %s\n'
+                                 '\t\t\tsubConnections: %s\n'
+                                 '\t\t\tmistakes: %s\n'
+                                 '\t\t\tsubmissions: %s\n'
+                                 '\t\t\ttotalGuesses: %s\n'
+                                 '\t\t\tscore: %s\n'
+                                 '\t\t\tregistered: %s\n'
+                                 '\t\t\tsilenced: %s\n'
+                                 '\t\t\tcompleted: %s\n'
+                                 '\t\t\tsucceeded: %s',
+                                 load_player.name, load_player.winCount, load_player.connectionCount, load_player.subConnectionCount,
+                                 load_player.mistakeCount, load_player.submissionCount, load_player.totalGuessCount, load_player.score,
+                                 load_player.registered, load_player.silenced, load_player.completedToday, load_player.succeededToday)
+        self.rebuild_leaderboard()
+        logger.info(f'Successfully loaded tracker {self.key} with {len(players)} players')
+
+    def new_player(self, name: str, userId: int = None) -> Player:
+        return self.table.add(name, userId)
+
+    def rebuild_leaderboard(self):
+        players = list(self.players)
+        self.leaderboard.rebuild(players, self.table.stats(np.array([player.index for player in players], dtype=np.intp)))
+
+    def save_players(self, *players: Player):
+        # only the given players are written, or every player if none are given
+        if players:
+            self.leaderboard.update(*players)
+        else:
+            players = self.players
+            self.rebuild_leaderboard()
+        self.persistence.mark_players(*players)
+
+    def save_state(self):
+        self.persistence.mark_state()
+
+    def get_state(self) -> dict:
+        state = {'puzzle_number': self.puzzle_number,
+                 'last_scored': self.last_scored.isoformat(),
+                 'scored_today': self.scored_today,
+                 'warning_offset': self.warning_offset,
+                 'scoring_version': self.scoring_version}
+        if self.text_channel_id:
+            state['text_channel'] = self.text_channel_id
+        if self.guild_id:
+            state['guild_id'] = self.guild_id
+        if self.timezone:
+            state['timezone'] = self.timezone
+        return state
+
+    def delete_player(self, player: Player):
+        self.players.remove(player)
+        self.leaderboard.remove(player)
+        self.table.remove(player)
+        self.persistence.mark_deleted(player_key(player.userId, player.name))
+
+    def get_scoreboard_embeds(self, scoreboard: list, puzzle_number: int = None) -> list:
+        return chunk_embeds(f"Scoreboard for {self.game.title} #{puzzle_number or self.puzzle_number}", scoreboard, Color.green())
+
+    def get_reminder(self, players) -> Reminder:
+        mentions = []
+        direct = []
+        for player in players:
+            if player.dmReminders and player.userId:
+                direct.append(player.userId)
+            else:
+                mentions.append(player.mention)
+        return Reminder(mentions, direct)
+
+    # adds a result to a player's running totals and returns its score, shared with the backfill
+    def apply_result(self, player: Player, result: ParsedResult) -> int:
+        player.submissionCount += 1
+        player.totalGuessCount += result.guess_count
+        player.subConnectionCount += result.progress
+        player.mistakeCount += result.mistakes
+        if result.succeeded:
+            player.connectionCount += 1
+        return self.game.score(self, result)
+
+    # The mutations below are only run by self.mutations, one at a time. They change state and decide what
+    # to send, the sending happens afterwards in the caller.
+    def submit(self, user: User, result: ParsedResult, timestamp: float) -> Submission:
+        if self.scored_today:
+            return Submission('closed', None, 0, None, None)
+        if not self.players:
+            return Submission('unregistered', None, 0, f'{user.mention}, there are no registered players! Please register and resend your results to be the first.', None)
+        player = self.find_player(user)
+        if not player:
+            return Submission('unregistered', None, 0, f'{user.name}, you are not registered! Please register and resend your results.', None)
+        if player.completedToday:
+            logger.info('%s tried to resubmit results', player.name)
+            return Submission('duplicate', player, 0, f'{player.name}, you have already submitted your results today.', None)
+        logger.info('%s submitted results for puzzle #%s', player.name, result.puzzle_number)
+        if not self.puzzle_number:
+            # a new tracker doesn't know which puzzle is current yet, the first result tells it
+            logger.info(f'Tracker {self.key} starts at puzzle #{result.puzzle_number}')
+            self.puzzle_number = result.puzzle_number
+            self.save_state()
+        if result.puzzle_number != self.puzzle_number:
+            return Submission('rejected', player, 0, f'The current puzzle # is {self.puzzle_number}. Your submission for puzzle #{result.puzzle_number} has not been accepted.', None)
+        player.score = self.apply_result(player, result)
+        if result.succeeded:
+            player.succeededToday = True
+        logger.info('Player %s - score: %s, succeeded: %s', player.name, player.score, player.succeededToday)
+
+        player.completedToday = True
+        self.save_players(player)
+        self.history.append(result.puzzle_number, player.userId or 0, result.guesses, result.mistakes, player.score, timestamp)
+        self.persistence.mark_history()
+        self.charts.invalidate()
+        # the last submission of the day scores it right away
+        return Submission('accepted', player, player.score, None, self.finish_day())
+
+    def finish_day(self) -> DayEnd:
+        return self.end_day() if self.players.all_completed() else None
+
+    def end_day(self, midnight: bool = False) -> DayEnd:
+        # scores the day once, returns None if it already was
+        if self.scored_today:
+            return None
+        shamed = []
+        if midnight:
+            for player in self.players.registered:
+                if not player.completedToday:
+                    shamed.append(player.mention)
+        self.last_scored = datetime.datetime.now().astimezone()
+        with metrics.time('tally_seconds'):
+            scoreboard, winners = self.tally_scores()
+        self.scored_today = True
+        self.save_state()
+        # only the winners' stats changed, the rest of the leaderboard stays as it is
+        if winners:
+            self.save_players(*winners)
+        self.charts.invalidate()
+        return DayEnd(chunk_mentions(shamed, f'SHAME ON {{mentions}} FOR NOT DOING THE {self.puzzle_title.upper()}!'),
+                      self.get_scoreboard_embeds(scoreboard, self.puzzle_number), self.puzzle_number, scoreboard_data(self))
+
+    def start_day(self) -> Reminder:
+        # moves on to the next puzzle, returns who to remind of it: everyone registered
+        self.scored_today = False
+        self.sent_warning = False
+        # only players who submitted have anything to reset, and none of it is a leaderboard stat
+        submitted = [player for player in self.players if player.completedToday or player.score]
+        for player in submitted:
+            player.score = 0
+            player.completedToday = False
+            player.succeededToday = False
+        if self.puzzle_number:
+            # a tracker that hasn't seen a result yet still takes its number from the first one
+            self.puzzle_number += 1
+        self.save_state()
+        self.persistence.mark_players(*submitted)
+        self.charts.invalidate()
+        return self.get_reminder(self.players.registered)
+
+    def rollover(self) -> tuple:
+        # midnight: scores the day if that didn't happen yet and starts the next one without a submission slipping in between
+        return self.end_day(midnight=True), self.start_day()
+
+    def take_warning(self) -> Reminder:
+        # who to warn before midnight, or None if there is nothing to warn about
+        if not self.players or self.sent_warning or self.scored_today:
+            return None
+        self.sent_warning = True
+        return self.get_reminder(player for player in self.players.registered if not player.completedToday and not player.silenced)
+
+    def apply_rescore(self, rescore: Rescore) -> bool:
+        # switches to the rescore's policy, returns False if a submission or another rescore came in since it was computed
+        if len(self.history) != rescore.rows or self.policy != rescore.old_policy:
+            return False
+        for user_id, old_wins, new_wins in zip(rescore.user_ids.tolist(), rescore.old_wins.tolist(), rescore.new_wins.tolist()):
+            player = self.players.get_by_id(user_id)
+            if player and old_wins != new_wins:
+                # wins from before the history was kept are left as they are
+                player.winCount = max(0, player.winCount + new_wins - old_wins)
+        for user_id, score in rescore.today_scores.items():
+            player = self.players.get_by_id(user_id)
+            if player and player.completedToday:
+                player.score = score
+        self.history.set_scores(rescore.scores)
+        self.scoring_version = rescore.policy.version
+        self.save_state()
+        self.save_players()
+        self.charts.invalidate()
+        logger.info(f'Tracker {self.key} now scores with policy {rescore.policy.describe()}')
+        return True
+
+    def rescore_diff(self, rescore: Rescore) -> list:
+        # (name, wins, new wins, place, new place) on the wins leaderboard for every player the rescore moves
+        players = sorted(self.leaderboard.order, key=self.leaderboard.order.get)
+        deltas = dict(zip(rescore.user_ids.tolist(), (rescore.new_wins - rescore.old_wins).tolist()))
+        wins = np.array([player.winCount for player in players], dtype=np.int64)
+        new_wins = np.maximum(0, wins + np.array([deltas.get(player.userId, 0) for player in players], dtype=np.int64))
+        places = win_places(wins)
+        new_places = win_places(new_wins)
+        changed = np.flatnonzero((wins != new_wins) | (places != new_places))
+        return sorted(((players[position].name, int(wins[position]), int(new_wins[position]), int(places[position]), int(new_places[position]))
+                       for position in changed), key=lambda row: row[4])
+
+    async def process(self, message: Message, result: ParsedResult, received_at: float = None) -> DayEnd:
+        # applies a submission through the writer and then sends its feedback, returns the day's end if it completed the day
+        submission = await self.mutations.submit(self.submit, message.author, result, message.created_at.timestamp())
+        metrics.inc('submissions', outcome=submission.outcome)
+        try:
+            if submission.reply:
+                await message.channel.send(submission.reply)
+            elif submission.outcome == 'accepted':
+                await self.client.reactions.send_feedback(message, result, submission.score, received_at)
+        except Exception as e:
+            logger.exception(f'Error while processing results from {message.author.name}: {e}')
+        return submission.day
+
+    def tally_scores(self) -> tuple:
+        # (scoreboard fields, players who won)
+        if not self.players or self.scored_today:
+            return [], []
+
+        logger.info(f'Tallying scores for puzzle #{self.puzzle_number}')
+        scoreboard = []
+        placeCounter = 0
+
+        # players who are registered and completed the connections, by score and then by who finished first
+        completed = list(self.players.completed)
+        indices = np.array([player.index for player in completed], dtype=np.intp)
+        scores = self.table.columns['score'][indices]
+        ranking = np.argsort(-scores, kind='stable')
+        connections_players = [completed[position] for position in ranking]
+
+        # the one/those with the highest score win, out of those the policy lets win
+        eligible = self.table.columns['succeededToday'][indices] | (self.policy.win_rule == 'top')
+        winners = []
+        if eligible.any() and scores[eligible].max() > 0:
+            won = eligible & (scores == scores[eligible].max())
+            self.table.columns['winCount'][indices[won]] += 1
+            winners = [completed[position] for position in np.flatnonzero(won)]
+
+        prevScore = -1
+        for player in connections_players:
+            if player.score != prevScore:
+                placeCounter += 1
+            prevScore = player.score
+            if player.score == 1:
+                title = f"{placeCounter}. (1 point)"
+            else:
+                title = f"{placeCounter}. ({player.score} points)"
+            if player.winCount == 1:
+                subResult = f"{player.name} (1 win)"
+            else:
+                subResult = f"{player.name} ({player.winCount} wins)"
+            scoreboard.append([title, subResult])
+        return scoreboard, winners
+
+
+def read_tracker_states(tracker_dir: str) -> dict:
+    # tracker key -> saved state for every tracker on disk, without loading their players
+    states = {}
+    if not os.path.isdir(tracker_dir):
+        return states
+    for name in os.listdir(tracker_dir):
+        directory = os.path.join(tracker_dir, name)
+        key = int(name) if name.isdigit() else name
+        try:
+            split_key(key)
+        except (ValueError, KeyError):
+            continue
+        if not os.path.isdir(directory):
+            continue
+        storage = open_storage(None, directory)
+        try:
+            states[key] = storage.load_state()
+        finally:
+            storage.close()
+    return states
+
+
+def move_legacy_files(directory: str):
+    # moves a single-server deployment's files from the working directory into its tracker directory
+    os.makedirs(directory, exist_ok=True)
+    db_filename = os.getenv('DB_FILENAME', 'connections.db')
+    filenames = [db_filename, f'{db_filename}-wal', f'{db_filename}-shm', os.getenv('JSON_FILENAME', 'info.json'), os.getenv('HISTORY_DIR', 'history')]
+    filenames.extend(name for name in os.listdir('.') if name.startswith('backfill-') and name.endswith('.json'))
+    for filename in filenames:
+        if os.path.exists(filename):
+            destination = os.path.join(directory, filename)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(filename, destination)
+            logger.info(f'Moved {filename} to {directory}')